@@ -0,0 +1,145 @@
+"""Compares the allocations and speed of the old and current packet encode/decode paths.
+
+The old paths are the original implementations, kept here for reference: messages were
+built by concatenating `struct.pack` results, and replies were read with `socket.recv`
+and unpacked with format strings. The current paths pack into the `MessageBuilder`
+buffer and read into the client's receive buffer, decoding from a memoryview. Packets are
+sent over loopback, so no simulator is needed.
+
+    python benchmarkPackets.py --calls 20000
+"""
+import argparse
+import socket
+import struct
+import timeit
+import tracemalloc
+
+import xpc
+
+
+DATA_ROWS = [[i] + [float(j) for j in range(8)] for i in range(8)]
+DREFS = ["sim/flightmodel/position/indicated_airspeed",
+         "sim/flightmodel/position/vh_ind_fpm",
+         "sim/cockpit/switches/gear_handle_status"]
+DREF_VALUES = [120.0, [500.0, 0.0], 1.0]
+
+
+# The original implementations
+def oldPackDATA(data):
+    buffer = struct.pack(b"<4sx", b"DATA")
+    for row in data:
+        if len(row) != 9:
+            raise ValueError("Row does not contain exactly 9 values. <" + str(row) + ">")
+        buffer += struct.pack(b"<I8f", *row)
+    return buffer
+
+
+def oldPackDREFs(drefs, values):
+    buffer = struct.pack(b"<4sx", b"DREF")
+    for dref, value in zip(drefs, values):
+        if hasattr(value, "__len__"):
+            fmt = "<B{0:d}sB{1:d}f".format(len(dref), len(value))
+            buffer += struct.pack(fmt.encode(), len(dref), dref.encode(), len(value), *value)
+        else:
+            fmt = "<B{0:d}sBf".format(len(dref))
+            buffer += struct.pack(fmt.encode(), len(dref), dref.encode(), 1, value)
+    return buffer
+
+
+def oldReadDATA(sock):
+    buffer = sock.recv(16384)
+    if len(buffer) < 6:
+        return None
+    rows = (len(buffer) - 5) // 36
+    data = []
+    for i in range(rows):
+        data.append(struct.unpack_from(b"9f", buffer, 5 + 36*i))
+    return data
+
+
+def oldParseRESP(buffer):
+    resultCount = struct.unpack_from(b"B", buffer, 5)[0]
+    offset = 6
+    result = []
+    for i in range(resultCount):
+        rowLen = struct.unpack_from(b"B", buffer, offset)[0]
+        offset += 1
+        fmt = "<{0:d}f".format(rowLen)
+        row = struct.unpack_from(fmt.encode(), buffer, offset)
+        result.append(row)
+        offset += rowLen * 4
+    return result
+
+
+def packRESP(rows):
+    """Builds a RESP reply holding `rows`, as the plugin would send it."""
+    buffer = struct.pack(b"<4sxB", b"RESP", len(rows))
+    for row in rows:
+        buffer += struct.pack("<B{0:d}f".format(len(row)).encode(), len(row), *row)
+    return buffer
+
+
+def peakBytes(func):
+    """Returns the peak memory allocated by one call of `func`, after a warm-up call."""
+    func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def microseconds(func, calls):
+    """Returns the best time of one call of `func` over 5 runs of `calls` calls, in us."""
+    return min(timeit.repeat(func, number=calls, repeat=5)) / calls * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the old and current packet encode/decode paths.")
+    parser.add_argument("--calls", type=int, default=20000, help="calls per timing run")
+    args = parser.parse_args(argv)
+
+    client = xpc.XPlaneConnect("127.0.0.1", xpPort=9, timeout=1000)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = ("127.0.0.1", client.socket.getsockname()[1])
+    dataPacket = bytes(client._builder.packDATA(DATA_ROWS))
+    respPacket = packRESP([[120.0], [500.0, 0.0], [1.0]])
+    respView = memoryview(bytearray(respPacket))
+
+    # Each receive case sends the packet it reads, so both paths include the same sendto
+    def oldReceive():
+        sender.sendto(dataPacket, address)
+        return oldReadDATA(client.socket)
+
+    def newReceive():
+        sender.sendto(dataPacket, address)
+        return client._parseDATA(client._recv())
+
+    # (name, old, new, the part of the results that must agree)
+    same = lambda result: result
+    values = lambda rows: [row[1:] for row in rows]  # The old path read the row index as a float
+    cases = [
+        ("pack DATA (8 rows)", lambda: oldPackDATA(DATA_ROWS), lambda: client._builder.packDATA(DATA_ROWS), same),
+        ("pack DREF (3 drefs)", lambda: oldPackDREFs(DREFS, DREF_VALUES),
+         lambda: client._builder.packDREFs(DREFS, DREF_VALUES), same),
+        ("receive + parse DATA", oldReceive, newReceive, values),
+        ("parse RESP (3 drefs)", lambda: oldParseRESP(respPacket), lambda: client._parseRESP(respView), same),
+    ]
+
+    try:
+        print(f"{'':24}{'old bytes':>10}{'new bytes':>10}{'old us':>10}{'new us':>10}")
+        for name, old, new, key in cases:
+            if key(old()) != key(new()):
+                raise AssertionError(name + ": the old and new paths disagree.")
+            print(f"{name:24}{peakBytes(old):10d}{peakBytes(new):10d}"
+                  f"{microseconds(old, args.calls):10.2f}{microseconds(new, args.calls):10.2f}")
+    finally:
+        sender.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import math
+
+from maneuvers import deviation
+
+
+class Scale(object):
+    """A unit conversion: `output = source * factor + offset`."""
+    def __init__(self, source, output=None, factor=1.0, offset=0.0):
+        """Creates the stage. `output` defaults to `source`, converting the channel in place."""
+        self.source = source
+        self.output = source if output is None else output
+        self.factor = factor
+        self.offset = offset
+
+    def reset(self):
+        pass
+
+    def update(self, time, value):
+        return value * self.factor + self.offset
+
+
+class Rate(object):
+    """The rate of change of a channel per second, by finite difference of consecutive samples.
+
+       The difference uses the samples' own timestamps, so late or skipped samples do not
+       distort the rate, and takes the shorter way round for channels that wrap (headings).
+    """
+    def __init__(self, source, output, wrap=None):
+        self.source = source
+        self.output = output
+        self.wrap = wrap
+        self.reset()
+
+    def reset(self):
+        self.lastTime = None
+        self.lastValue = 0.0
+        self.rate = 0.0
+
+    def update(self, time, value):
+        if self.lastTime is not None and time > self.lastTime:
+            self.rate = deviation(value, self.lastValue, self.wrap) / (time - self.lastTime)
+        self.lastTime, self.lastValue = time, value
+        return self.rate
+
+
+class Ema(object):
+    """An exponential moving average (first order low-pass filter) of a channel.
+
+       The weight of each sample follows from the time since the previous one and the
+       filter's time constant, so the response is the same whatever the sample rate.
+    """
+    def __init__(self, source, output=None, timeConstant=1.0):
+        """Creates the stage. `output` defaults to `source`, filtering the channel in place."""
+        if timeConstant <= 0:
+            raise ValueError("timeConstant must be positive.")
+
+        self.source = source
+        self.output = source if output is None else output
+        self.timeConstant = timeConstant
+        self.reset()
+
+    def reset(self):
+        self.lastTime = None
+        self.value = 0.0
+
+    def update(self, time, value):
+        if self.lastTime is None:
+            self.value = value
+        elif time > self.lastTime:
+            alpha = 1.0 - math.exp(-(time - self.lastTime) / self.timeConstant)
+            self.value += alpha * (value - self.value)
+        self.lastTime = time
+        return self.value
+
+
+class ChannelPipeline(object):
+    """Runs a list of stages over each sample as it arrives.
+
+       Every stage reads one channel and writes one channel, either replacing a channel in
+       place (conversions, filters) or adding a new one after the input channels. Stages run
+       in order, so a stage can read what an earlier one wrote, e.g. a filter of a rate.
+       Each stage keeps only the state of the previous sample, so a sample costs O(stages)
+       however long the session runs.
+    """
+    def __init__(self, channels, stages):
+        """Creates a pipeline.
+
+            Args:
+              channels: The names of the input channels, in the order of each sample.
+              stages: The stages to run, in order.
+        """
+        self.inputs = len(channels)
+        self.channels = list(channels)
+        for stage in stages:
+            if stage.source not in self.channels:
+                raise ValueError("Unknown channel: " + str(stage.source))
+            if stage.output not in self.channels:
+                self.channels.append(stage.output)
+
+        columns = dict((name, i) for i, name in enumerate(self.channels))
+        self.stages = [(columns[stage.source], columns[stage.output], stage) for stage in stages]
+        self.padding = [0.0] * (len(self.channels) - self.inputs)
+
+    def reset(self):
+        """Forgets the previous sample, e.g. when a new session starts."""
+        for source, output, stage in self.stages:
+            stage.reset()
+
+    def process(self, time, sample):
+        """Runs every stage on one sample.
+
+            Args:
+              time: The time of the sample in seconds.
+              sample: The value of each input channel.
+
+            Returns: A list with the value of every channel in `channels`.
+        """
+        values = list(sample) + self.padding
+        for source, output, stage in self.stages:
+            values[output] = stage.update(time, values[source])
+        return values
+
+
+def unitConversions():
+    """Returns the stages that convert raw X-Plane values to the units of the panels."""
+    return [Scale("Altitude", factor=3.28084)]  # Altitude is pulled in meters so convert to feet
+
+
+def attitudeRates(timeConstant=0.5):
+    """Returns the stages deriving pitch, roll and yaw rates (degrees per second), each
+       smoothed with a low-pass filter of `timeConstant` seconds.
+    """
+    return [Rate("Pitch", "Pitch Rate"), Ema("Pitch Rate", timeConstant=timeConstant),
+            Rate("Roll", "Roll Rate"), Ema("Roll Rate", timeConstant=timeConstant),
+            Rate("True Heading", "Yaw Rate", wrap=360), Ema("Yaw Rate", timeConstant=timeConstant)]
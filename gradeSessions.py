@@ -0,0 +1,175 @@
+"""Regrades the maneuvers of recorded sessions with new tolerances.
+
+Every maneuver found in the given session logs is graded again from its recorded samples,
+using the same rules as the instructor panel (see `maneuvers.standardManeuvers`) evaluated
+as NumPy masks over each maneuver at once. Logs are spread over a pool of processes.
+
+    python gradeSessions.py logs/*.xpclog --altitude-error 150 --output grades.csv
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from maneuvers import gradeSamples, standardManeuvers
+from sessionLog import (SessionLogReader, MANEUVERS, TARGET_FIELDS, RECORD_SAMPLE, RECORD_EVENT,
+                        EVENT_SESSION_START, EVENT_SESSION_END, EVENT_DISCONNECTED,
+                        EVENT_MANEUVER_START, EVENT_MANEUVER_PASSED, EVENT_MANEUVER_FAILED)
+
+COLUMNS = ["Log", "Session", "Maneuver", "Start Time", "End Time", "Recorded", "Regraded", "Reason"]
+
+# Events that end whatever maneuver is being flown
+_ENDING_EVENTS = [EVENT_SESSION_START, EVENT_SESSION_END, EVENT_DISCONNECTED, EVENT_MANEUVER_START,
+                  EVENT_MANEUVER_PASSED, EVENT_MANEUVER_FAILED]
+
+
+def gradeLog(path, altitudeError, headingError, airspeedError):
+    """Regrades every maneuver recorded in one session log.
+
+       A maneuver is graded over the samples recorded between its start event and the event
+       that ended it, so a looser tolerance cannot extend it past where it was recorded to
+       end. If no sample decides it within that window, it ends the way ending it by hand
+       would: passed for maneuvers that only hold limits, aborted otherwise.
+
+        Returns: A list of rows matching COLUMNS.
+    """
+    maneuvers = _maneuvers(altitudeError, headingError, airspeedError)
+    rows = []
+    with SessionLogReader(path) as reader:
+        for session, (start, stop) in enumerate(reader.sessions()):
+            rows.extend(_gradeSession(reader, maneuvers, path, session, start, stop))
+    return rows
+
+
+def gradeSession(path, session, start, stop, altitudeError, headingError, airspeedError):
+    """Regrades the maneuvers of one session of a log, the records `[start, stop)`, as
+       `gradeLog` does. This is the unit of work `gradeLogs` spreads over processes.
+
+        Returns: A list of rows matching COLUMNS.
+    """
+    with SessionLogReader(path) as reader:
+        return _gradeSession(reader, _maneuvers(altitudeError, headingError, airspeedError), path,
+                             session, start, stop)
+
+
+def _maneuvers(altitudeError, headingError, airspeedError):
+    return dict((maneuver.name, maneuver)
+                for maneuver in standardManeuvers(altitudeError, headingError, airspeedError))
+
+
+def _gradeSession(reader, maneuvers, path, session, start, stop):
+    """Regrades every maneuver started in the session `[start, stop)` of an open log."""
+    columns = dict((name, i) for i, name in enumerate(reader.channels))
+    records = reader.records[start:stop]
+    types, codes = records["type"], records["code"]
+
+    isEvent = types == RECORD_EVENT
+    sampleNumbers = start + numpy.flatnonzero(types == RECORD_SAMPLE)
+    endNumbers = start + numpy.flatnonzero(isEvent & numpy.isin(codes, _ENDING_EVENTS))
+    starts = start + numpy.flatnonzero(isEvent & (codes == EVENT_MANEUVER_START))
+    return [_gradeManeuver(reader, maneuvers, columns, sampleNumbers, endNumbers, int(number), start, stop,
+                           path, session)
+            for number in starts]
+
+
+def _gradeManeuver(reader, maneuvers, columns, sampleNumbers, endNumbers, number, start, stop, path,
+                   session):
+    """Regrades the maneuver started by record `number` of the session `[start, stop)`."""
+    records = reader.records
+    event = records[number]
+    name = MANEUVERS[event["arg"]]
+    maneuver = maneuvers[name]
+    targets = dict(zip(TARGET_FIELDS, event["values"][:len(TARGET_FIELDS)].tolist()))
+
+    # The maneuver runs until the next event that ends it, or the end of the session
+    position = numpy.searchsorted(endNumbers, number, side="right")
+    end = int(endNumbers[position]) if position < len(endNumbers) else stop
+    end = min(end, stop)
+    recorded = "Ended"
+    if end < stop and records[end]["type"] == RECORD_EVENT:
+        code = records[end]["code"]
+        if code == EVENT_MANEUVER_PASSED:
+            recorded = "Passed"
+        elif code == EVENT_MANEUVER_FAILED:
+            recorded = "Failed"
+
+    # Its references are the last sample before it started, and its samples those after
+    first = numpy.searchsorted(sampleNumbers, number)
+    last = numpy.searchsorted(sampleNumbers, end)
+    width = len(reader.channels)
+    values = records["values"][sampleNumbers[first:last], :width]
+    if first > 0 and sampleNumbers[first - 1] >= start:
+        row = records["values"][sampleNumbers[first - 1], :width]
+    elif len(values):
+        row = values[0]
+    else:
+        return [path, session, name, float(event["time"]), float(event["time"]), recorded, "Ungraded",
+                "No samples"]
+
+    outcome = gradeSamples(maneuver, columns, values, row, targets)
+    if outcome is None:
+        index = len(values) - 1
+        passed, reason = maneuver.passesWhenEnded, None if maneuver.passesWhenEnded else "Aborted"
+    else:
+        index, passed, reason = outcome
+    endTime = float(records[sampleNumbers[first + index]]["time"]) if len(values) else float(event["time"])
+    return [path, session, name, float(event["time"]), endTime, recorded,
+            "Passed" if passed else "Failed", reason or ""]
+
+
+def gradeLogs(paths, altitudeError, headingError, airspeedError, workers=None):
+    """Regrades every log in `paths` on a pool of `workers` processes (default: one per CPU).
+
+       Each recorded session is a separate task, so the sessions of one large log are
+       graded in parallel too.
+
+        Returns: The rows of every log, in the order of `paths` and of their sessions.
+    """
+    tasks = []
+    for path in paths:
+        with SessionLogReader(path) as reader:
+            tasks.extend((path, session, start, stop) for session, (start, stop) in enumerate(reader.sessions()))
+    if not tasks:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    count = len(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths, sessions, starts, stops = zip(*tasks)
+        results = pool.map(gradeSession, paths, sessions, starts, stops, [altitudeError] * count,
+                           [headingError] * count, [airspeedError] * count,
+                           chunksize=max(1, count // (4 * workers)))
+        return [row for rows in results for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regrade the maneuvers of recorded sessions.")
+    parser.add_argument("logs", nargs="+", help="session logs to regrade")
+    parser.add_argument("--altitude-error", type=float, default=200.0, help="altitude tolerance (+/- ft)")
+    parser.add_argument("--heading-error", type=float, default=20.0, help="heading tolerance (+/- degrees)")
+    parser.add_argument("--airspeed-error", type=float, default=10.0, help="airspeed tolerance (+/- kt)")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: one per CPU)")
+    parser.add_argument("--output", default=None, help="CSV file to write (default: standard output)")
+    args = parser.parse_args(argv)
+
+    rows = gradeLogs(args.logs, args.altitude_error, args.heading_error, args.airspeed_error, args.workers)
+
+    output = open(args.output, "w", newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    finally:
+        if args.output:
+            output.close()
+
+    changed = sum(1 for row in rows if row[5] in ("Passed", "Failed") and row[5] != row[6])
+    print(f"Regraded {len(rows)} maneuvers in {len(args.logs)} logs; {changed} changed outcome",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
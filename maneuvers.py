@@ -0,0 +1,314 @@
+import math
+from threading import Lock
+
+
+def deviation(value, reference, wrap=None):
+    """Returns how far `value` is from `reference`, taking the shorter way round if the
+       channel wraps around every `wrap` units (360 for headings).
+    """
+    difference = value - reference
+    if wrap is not None:
+        difference = (difference + wrap / 2.0) % wrap - wrap / 2.0
+    return difference
+
+
+class Limit(object):
+    """A tolerance band around a reference value of one channel.
+
+       The reference is either the value of the channel when the maneuver starts, or a named
+       target given when it starts, e.g. the altitude to climb to.
+    """
+    def __init__(self, channel, tolerance, reason, target=None, wrap=None):
+        """Creates a limit.
+
+            Args:
+              channel: The name of the channel to check.
+              tolerance: The largest allowed deviation (+/-) from the reference.
+              reason: A short description of the limit, reported when it decides the outcome.
+              target: The name of the target to use as the reference. None uses the value of
+                the channel at the start of the maneuver.
+              wrap: The period of a channel that wraps around, e.g. 360 for headings.
+        """
+        self.channel = channel
+        self.tolerance = tolerance
+        self.reason = reason
+        self.target = target
+        self.wrap = wrap
+
+    def reference(self, row, columns, targets):
+        """Returns the reference value for a maneuver starting at `row`."""
+        if self.target is None:
+            return row[columns[self.channel]]
+        return targets[self.target]
+
+    def within(self, value, reference):
+        """True if `value` is inside the band around `reference`."""
+        return abs(deviation(value, reference, self.wrap)) <= self.tolerance
+
+
+class DeviationStats(object):
+    """Running statistics of the deviation of one channel from its reference.
+
+       Welford's method keeps the mean and the sum of squared differences from it, so each
+       sample is added in O(1) without keeping the samples and without the cancellation of
+       a naive sum of squares. Time in tolerance counts the time since the previous sample
+       when the new sample is inside the band.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sumSquares = 0.0  # Sum of squared deviations, for the RMS error
+        self.timeWithin = 0.0  # Seconds inside the tolerance band
+        self.duration = 0.0  # Seconds covered by the samples
+
+    def add(self, value, within, elapsed):
+        """Adds one deviation.
+
+            Args:
+              value: The deviation of the sample from the reference.
+              within: True if the sample is inside the tolerance band.
+              elapsed: The seconds since the previous sample.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.sumSquares += value * value
+        self.duration += elapsed
+        if within:
+            self.timeWithin += elapsed
+
+    def std(self):
+        """The (population) standard deviation, or 0.0 without samples."""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def rms(self):
+        """The root mean square deviation, or 0.0 without samples."""
+        return math.sqrt(self.sumSquares / self.count) if self.count else 0.0
+
+    def summary(self):
+        """Returns `(count, mean, std, min, max, rms, timeWithin, duration)`, NaN for the
+           values that are undefined without samples.
+        """
+        if not self.count:
+            return (0, math.nan, math.nan, math.nan, math.nan, math.nan, 0.0, self.duration)
+        return (self.count, self.mean, self.std(), self.minimum, self.maximum, self.rms(),
+                self.timeWithin, self.duration)
+
+
+class Maneuver(object):
+    """A declarative description of how a maneuver is graded.
+
+       While the maneuver is active every one of its `limits` must hold on every sample, or it
+       fails for the reason of the first limit that does not. If it has a `capture` limit, it
+       passes on the first sample inside that band. Ending it by hand before that passes it if
+       `passesWhenEnded` is True, which suits maneuvers that are only about holding limits,
+       and fails it as aborted otherwise.
+    """
+    def __init__(self, name, limits=(), capture=None, passesWhenEnded=False):
+        self.name = name
+        self.limits = list(limits)
+        self.capture = capture
+        self.passesWhenEnded = passesWhenEnded
+
+
+class ActiveManeuver(object):
+    """A maneuver being flown, with its references resolved.
+
+       It also keeps a `DeviationStats` for each channel it limits, keyed by the channel name,
+       which `accumulate` updates with every sample.
+    """
+    def __init__(self, maneuver, columns, row, startTime, targets):
+        self.maneuver = maneuver
+        self.name = maneuver.name
+        self.startTime = startTime
+        self.lastTime = startTime
+        self.targets = dict(targets)
+
+        # Resolve every limit to (column, reference, limit) once, so a check is only arithmetic
+        self.limits = [(columns[limit.channel], limit.reference(row, columns, targets), limit)
+                       for limit in maneuver.limits]
+        capture = maneuver.capture
+        self.capture = None if capture is None else (
+            columns[capture.channel], capture.reference(row, columns, targets), capture)
+
+        # Measure each limit and the capture, e.g. the altitude of a climb against its target
+        self.statistics = {}
+        self.tracked = []  # (column, reference, limit, stats)
+        resolved = self.limits + ([] if self.capture is None else [self.capture])
+        for column, reference, limit in resolved:
+            if limit.channel not in self.statistics:
+                self.statistics[limit.channel] = DeviationStats()
+                self.tracked.append((column, reference, limit, self.statistics[limit.channel]))
+
+    def accumulate(self, row, sampleTime):
+        """Adds the deviations of one sample to `statistics`."""
+        elapsed = max(sampleTime - self.lastTime, 0.0)
+        self.lastTime = sampleTime
+        for column, reference, limit, stats in self.tracked:
+            value = deviation(row[column], reference, limit.wrap)
+            stats.add(value, abs(value) <= limit.tolerance, elapsed)
+
+    def check(self, row):
+        """Grades one sample.
+
+            Returns: None while the maneuver continues, otherwise a tuple `(passed, reason)`.
+        """
+        if self.capture is not None:
+            column, reference, limit = self.capture
+            if limit.within(row[column], reference):
+                return True, None
+
+        for column, reference, limit in self.limits:
+            if not limit.within(row[column], reference):
+                return False, limit.reason
+        return None
+
+
+class ManeuverEngine(object):
+    """Grades maneuvers inline, one sample at a time.
+
+       `update` is called by the sampling loop with each new sample and checks every active
+       maneuver against it, so no sample is missed and no thread or sleep is needed. `start`
+       and `stop` may be called from another thread, e.g. by buttons; a lock keeps them from
+       interleaving with an update. Every sample also updates the deviation statistics of
+       the active maneuvers, so they are complete the moment one ends. When a maneuver ends,
+       `onEnd` is called as `onEnd(active, passed, reason, sampleTime)`, after the lock is
+       released, so it may start or stop maneuvers itself.
+    """
+    def __init__(self, channels, maneuvers, onEnd=None):
+        """Creates an engine.
+
+            Args:
+              channels: The names of the channels of each sample, in order.
+              maneuvers: The `Maneuver`s that can be started.
+              onEnd: A function called when a maneuver passes, fails or is ended.
+        """
+        self.columns = dict((name, i) for i, name in enumerate(channels))
+        self.maneuvers = dict((maneuver.name, maneuver) for maneuver in maneuvers)
+        self.onEnd = onEnd
+        self.active = []
+        self.lock = Lock()
+
+    def start(self, name, row, sampleTime=0.0, **targets):
+        """Starts a maneuver.
+
+            Args:
+              name: The name of the maneuver.
+              row: The current value of every channel, the references of the limits.
+              sampleTime: The session time of the start in seconds.
+              targets: The targets the limits of the maneuver refer to, e.g. `altitude=5000`.
+
+            Returns: The `ActiveManeuver`.
+        """
+        active = ActiveManeuver(self.maneuvers[name], self.columns, row, sampleTime, targets)
+        with self.lock:
+            self.active.append(active)
+        return active
+
+    def update(self, row, sampleTime):
+        """Grades a new sample against every active maneuver, ending those it decides."""
+        if not self.active:
+            return
+        ended = []
+        with self.lock:
+            for active in list(self.active):
+                active.accumulate(row, sampleTime)
+                outcome = active.check(row)
+                if outcome is not None:
+                    self.active.remove(active)
+                    ended.append((active,) + outcome)
+        self._notify(ended, sampleTime)
+
+    def stop(self, sampleTime, active=None):
+        """Ends a maneuver by hand.
+
+            Args:
+              sampleTime: The session time of the end in seconds.
+              active: The maneuver to end. None ends every active maneuver.
+        """
+        ended = []
+        with self.lock:
+            for maneuver in list(self.active):
+                if active is None or maneuver is active:
+                    passed = maneuver.maneuver.passesWhenEnded
+                    self.active.remove(maneuver)
+                    ended.append((maneuver, passed, None if passed else "Aborted"))
+        self._notify(ended, sampleTime)
+
+    def _notify(self, ended, sampleTime):
+        """Calls `onEnd` for each `(active, passed, reason)` in `ended`, outside the lock."""
+        if self.onEnd is not None:
+            for active, passed, reason in ended:
+                self.onEnd(active, passed, reason, sampleTime)
+
+
+def gradeSamples(maneuver, columns, values, row, targets):
+    """Grades a recorded maneuver over a block of samples at once.
+
+       This is the vectorised counterpart of feeding the samples one by one to an
+       `ActiveManeuver`: each limit is evaluated as a NumPy mask over the whole block and the
+       outcome is decided by the first sample any mask flags, with the same precedence (the
+       capture first, then the limits in order).
+
+        Args:
+          maneuver: The `Maneuver` to grade.
+          columns: A dictionary mapping channel names to columns of `values`.
+          values: A NumPy array with one row per sample, in the order they were taken.
+          row: The value of every channel when the maneuver started.
+          targets: The targets the maneuver was started with.
+
+        Returns: A tuple `(index, passed, reason)` naming the sample that decided the outcome,
+          or None if no sample did.
+    """
+    active = ActiveManeuver(maneuver, columns, row, 0.0, targets)
+    first, outcome = len(values), None
+
+    if active.capture is not None:
+        column, reference, limit = active.capture
+        index = _firstTrue(limit.within(values[:, column], reference))
+        if index < first:
+            first, outcome = index, (True, None)
+
+    for column, reference, limit in active.limits:
+        index = _firstTrue(~limit.within(values[:, column], reference))
+        if index < first:
+            first, outcome = index, (False, limit.reason)
+
+    if outcome is None:
+        return None
+    return (first,) + outcome
+
+
+def _firstTrue(mask):
+    """Returns the index of the first True in a boolean array, or its length if there is none."""
+    if not len(mask):
+        return 0
+    index = int(mask.argmax())
+    return index if mask[index] else len(mask)
+
+
+def standardManeuvers(altitudeError, headingError, airspeedError):
+    """Returns the four maneuvers of the instructor panel with the given tolerances (+/-).
+
+       Climbs and descents pass when the altitude is captured within `altitudeError` of the
+       `altitude` target; turns pass when the heading is captured within `headingError` of
+       the `heading` target.
+    """
+    altitude = Limit("Altitude", altitudeError, "Altitude")
+    heading = Limit("True Heading", headingError, "Heading", wrap=360)
+    airspeed = Limit("Air Speed", airspeedError, "Airspeed")
+    return [
+        Maneuver("Straight-and-Level Flight", [altitude, heading, airspeed], passesWhenEnded=True),
+        Maneuver("Constant Airspeed Climbs", [heading, airspeed],
+                 capture=Limit("Altitude", altitudeError, "Altitude", target="altitude")),
+        Maneuver("Constant Airspeed Descents", [heading, airspeed],
+                 capture=Limit("Altitude", altitudeError, "Altitude", target="altitude")),
+        Maneuver("Turns to Headings", [altitude, airspeed],
+                 capture=Limit("True Heading", headingError, "Heading", target="heading", wrap=360)),
+    ]
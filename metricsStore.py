@@ -0,0 +1,242 @@
+import numpy
+
+
+class MetricsStore(object):
+    """A fixed-capacity history of samples for a set of named channels.
+
+       Every channel is a circular buffer backed by one preallocated NumPy array, and all
+       channels share a single write index and timestamp column. Each sample is written
+       twice, at slot `i` and `i + capacity`, so the most recent samples of any channel are
+       always one contiguous slice: appending is O(1), nothing is copied or re-sliced, and
+       plotting reads views straight out of the buffer.
+    """
+    def __init__(self, channels, capacity):
+        """Creates an empty store.
+
+            Args:
+              channels: The names of the channels, in the order samples are given.
+              capacity: The number of samples kept per channel.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+
+        self.channels = list(channels)
+        self.columns = dict((name, i) for i, name in enumerate(self.channels))
+        self.capacity = capacity
+        self.values = numpy.zeros((len(self.channels), 2 * capacity))
+        self.timestamps = numpy.zeros(2 * capacity)
+        self.count = 0  # Total samples appended since the last clear
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        """The retained samples of a channel, oldest first, as a contiguous view."""
+        return self.values[self.columns[name], self._start():self._end()]
+
+    def _end(self):
+        return (self.count - 1) % self.capacity + self.capacity + 1 if self.count else 0
+
+    def _start(self):
+        return self._end() - len(self)
+
+    def append(self, timestamp, sample):
+        """Appends one sample to every channel.
+
+            Args:
+              timestamp: The time of the sample in seconds.
+              sample: The value of each channel, in the order of `channels`.
+        """
+        slot = self.count % self.capacity
+        self.values[:, slot] = sample
+        self.values[:, slot + self.capacity] = sample
+        self.timestamps[slot] = timestamp
+        self.timestamps[slot + self.capacity] = timestamp
+        self.count += 1
+
+    def times(self):
+        """The timestamps of the retained samples, oldest first, as a contiguous view."""
+        return self.timestamps[self._start():self._end()]
+
+    def latest(self, name):
+        """The most recent value of a channel, or 0.0 if nothing has been recorded."""
+        if not self.count:
+            return 0.0
+        return float(self.values[self.columns[name], (self.count - 1) % self.capacity])
+
+    def latestTime(self):
+        """The timestamp of the most recent sample, or 0.0 if nothing has been recorded."""
+        if not self.count:
+            return 0.0
+        return float(self.timestamps[(self.count - 1) % self.capacity])
+
+    def latestRow(self):
+        """The most recent value of every channel, in the order of `channels`."""
+        if not self.count:
+            return [0.0] * len(self.channels)
+        return self.values[:, (self.count - 1) % self.capacity].tolist()
+
+    def snapshot(self):
+        """Copies the retained samples, so they can be handed to another thread.
+
+            Returns: A tuple `(times, values)` of new arrays, oldest first, with one row of
+              `values` per channel.
+        """
+        start, end = self._start(), self._end()
+        return self.timestamps[start:end].copy(), self.values[:, start:end].copy()
+
+    def clear(self):
+        """Forgets every sample without releasing the buffers."""
+        self.count = 0
+
+
+class TieredHistory(MetricsStore):
+    """A `MetricsStore` that also keeps older samples at progressively lower resolution.
+
+       The store itself holds the most recent samples at full resolution. Behind it sit
+       `levels` tiers; tier 1 summarises every `factor` samples into one bucket holding the
+       minimum, maximum and mean of each channel, tier 2 summarises every `factor` tier 1
+       buckets, and so on. Each tier is a fixed-size ring of `tierCapacity` buckets, so
+       memory is bounded no matter how long the session runs, appends cost O(levels), and a
+       query over any lookback reads views from a single tier.
+
+       The coarsest tier spans `tierCapacity * factor ** levels` samples (720,000 by default,
+       50 hours at 4 samples per second); anything older is dropped.
+    """
+    def __init__(self, channels, capacity, tierCapacity=720, factor=10, levels=3):
+        """Creates an empty history.
+
+            Args:
+              channels: The names of the channels, in the order samples are given.
+              capacity: The number of full resolution samples kept per channel.
+              tierCapacity: The number of buckets kept by each decimated tier.
+              factor: The number of entries of one tier summarised by a bucket of the next.
+              levels: The number of decimated tiers.
+        """
+        MetricsStore.__init__(self, channels, capacity)
+        if factor < 2:
+            raise ValueError("factor must be at least 2.")
+
+        self.factor = factor
+        self.tiers = [_Tier(self.channels, tierCapacity) for level in range(levels)]
+
+    def append(self, timestamp, sample):
+        """Appends one sample to every channel and folds it into the decimated tiers."""
+        MetricsStore.append(self, timestamp, sample)
+
+        sample = numpy.asarray(sample, dtype=float)
+        low, high, mean, time = sample, sample, sample, timestamp
+        for tier in self.tiers:
+            bucket = tier.accumulate(time, low, high, mean, self.factor)
+            if bucket is None:
+                break
+            time, low, high, mean = bucket
+
+    def clear(self):
+        """Forgets every sample and bucket without releasing the buffers."""
+        MetricsStore.clear(self)
+        for tier in self.tiers:
+            tier.clear()
+
+    def level(self, seconds=None):
+        """Returns the finest level that reaches `seconds` back from the latest sample.
+
+            Args:
+              seconds: The lookback in seconds. None asks for everything still retained.
+
+            Returns: 0 for the full resolution samples, or the number of a decimated tier. If no
+              level reaches far enough, the coarsest level is returned.
+        """
+        levels = [self] + [tier.mean for tier in self.tiers]
+        for level, store in enumerate(levels):
+            if store.count <= store.capacity:
+                return level  # Nothing has been overwritten yet
+            if seconds is not None and store.times()[0] <= self.latestTime() - seconds:
+                return level
+        return len(self.tiers)
+
+    def window(self, name, seconds=None):
+        """Gets the history of a channel over a lookback at the finest resolution available.
+
+            Args:
+              name: The channel to get.
+              seconds: The lookback in seconds. None returns everything still retained, the
+                whole session unless it is longer than the coarsest tier spans.
+
+            Returns: A tuple `(times, mean, low, high)` of views. At full resolution the three
+              value arrays are the raw samples. Decimated tiers lag by up to one bucket; the
+              newest samples are always available at level 0.
+        """
+        level = self.level(seconds)
+        if level == 0:
+            times = self.times()
+            values = self[name]
+            mean = low = high = values
+        else:
+            tier = self.tiers[level - 1]
+            times = tier.mean.times()
+            mean, low, high = tier.mean[name], tier.low[name], tier.high[name]
+
+        if seconds is not None and len(times):
+            start = numpy.searchsorted(times, self.latestTime() - seconds)
+            times, mean, low, high = times[start:], mean[start:], low[start:], high[start:]
+        return times, mean, low, high
+
+    def summary(self, name, seconds=None):
+        """Gets the minimum, maximum and mean of a channel over a lookback, from `window`.
+
+            Returns: A tuple `(low, high, mean)`, or None if nothing has been recorded.
+        """
+        times, mean, low, high = self.window(name, seconds)
+        if not len(times):
+            return None
+        return float(low.min()), float(high.max()), float(mean.mean())
+
+
+class _Tier(object):
+    """One decimated level of a `TieredHistory`: rings of bucket minima, maxima and means."""
+    def __init__(self, channels, capacity):
+        self.low = MetricsStore(channels, capacity)
+        self.high = MetricsStore(channels, capacity)
+        self.mean = MetricsStore(channels, capacity)
+
+        # The bucket being filled
+        self.pendingLow = numpy.empty(len(channels))
+        self.pendingHigh = numpy.empty(len(channels))
+        self.pendingSum = numpy.zeros(len(channels))
+        self.pendingTime = 0.0
+        self.pendingCount = 0
+
+    def accumulate(self, time, low, high, mean, factor):
+        """Adds one entry of the level below. Returns the completed bucket, if any."""
+        if self.pendingCount == 0:
+            self.pendingLow[:] = low
+            self.pendingHigh[:] = high
+            self.pendingSum[:] = mean
+            self.pendingTime = time
+        else:
+            numpy.minimum(self.pendingLow, low, out=self.pendingLow)
+            numpy.maximum(self.pendingHigh, high, out=self.pendingHigh)
+            self.pendingSum += mean
+            self.pendingTime += time
+        self.pendingCount += 1
+
+        if self.pendingCount < factor:
+            return None
+
+        time = self.pendingTime / factor
+        mean = self.pendingSum / factor
+        self.low.append(time, self.pendingLow)
+        self.high.append(time, self.pendingHigh)
+        self.mean.append(time, mean)
+        self.pendingCount = 0
+        return time, self.pendingLow, self.pendingHigh, mean
+
+    def clear(self):
+        self.low.clear()
+        self.high.clear()
+        self.mean.clear()
+        self.pendingCount = 0
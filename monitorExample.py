@@ -1,175 +1,176 @@
 # Imports 
 import sys
 import xpc
-from tkinter import *
 import time
+import math
 from threading import Thread, Event
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
-import csv
+import argparse
+import queue
+from metricsStore import TieredHistory
+from panelRenderer import PanelRenderer, PANEL_PLOTS
+from sampling import LatestValue, Sampler, CHANNELS, reportMissed
+from derivedChannels import ChannelPipeline, attitudeRates
+from maneuvers import ManeuverEngine, standardManeuvers
+from sessionLog import (SessionWriter, SessionLogReader, exportText, exportCSV, eventText, RECORD_SAMPLE,
+                        RECORD_EVENT, EVENT_DISCONNECTED, EVENT_SESSION_END, EVENT_MANEUVER_START, EVENT_MANEUVER_PASSED,
+                        EVENT_MANEUVER_FAILED, MANEUVERS, TARGET_FIELDS)
 
 # Globals
-timeInterval = 0.25  # Sample speed
-passingTime = [0.0]  # Time vector for plotting
+timeInterval = 0.25  # Sample speed: interval between position samples, in seconds
+airDataInterval = 0.25  # Interval between airspeed and vertical speed updates, in seconds
 client = Thread()  # Global client for XPlaneConnect
-maneuver = Thread() # Global maneuver for tests
 dataLimit = 100  # Limit for data points
 stopEvent = Event() # Event to stop the threads
-dataFile = 'data.txt' # Where data is stored
-csvDataFile = 'data.csv' #storing data into csv file
-maneuverStartAltitude = 0.0 # Capture position vector when maneuver is started
-maneuverStartHeading = 0.0 # Capture control vector when maneuver is started
-maneuverStartAirspeed = 0.0 # Capture airspeed value when maneuver is started
+logFile = 'data.xpclog' # Binary session log written while flying
+dataFile = 'data.txt' # Text export of each session, written when the panel closes
+csvDataFile = 'data.csv' # CSV export of each session, written when the panel closes
+sessionWriter = None # Background writer for logFile, None while replaying
+renderer = None # Draws the plots, created with the window
+frameRate = 5 # Display refreshes per second, independent of the sample speed
+latestSnapshot = LatestValue() # Newest copy of the plotted metrics, published by the sampling thread
+uiCalls = queue.Queue() # Widget updates requested by other threads, applied on the main thread
+timingInterval = 10.0 # Seconds between timing summaries written to the session log
+sampler = None # Samples the connected simulator and keeps its timing histograms
+replayFile = None # Session log being replayed instead of flying live
+replaySession = -1 # Session of replayFile to replay (negative counts from the last one)
+replaySpeed = 1.0 # Replay speed as a multiple of real time, 0 for as fast as possible
+lastOutcome = None # Outcome of the last maneuver graded, shown next to the recorded one during replay
 altitudeError = 200.0 # Error range for the altitude (+/-)
 headingError = 20.0 # Error range for the heading (+/-)
 airspeedError = 10.0 # Error range for the airspeed (+/-)
-endManeuverFlag = False # Linked to button to determine when maneuver is over 
-targetAltitude = 0 # Altitde the pilot must reach
-targetHeading = 0 # Heading the pilot must reach
-
-# Dictionary with all measurable metrics
-metrics = {
-    # "Time Stamp": [0.0],         #   year-mon-day hour:min:sec
-    "Latitude": [0.0],          #	double	n	degrees	The latitude of the aircraft
-    "Longitude": [0.0],         #   double	n	degrees	The longitude of the aircraft
-    "Altitude": [0.0],          #   double	n	meters	The elevation above MSL of the aircraft
-    "Pitch": [0.0],             #   float	y	degrees	The pitch relative to the plane normal to the Y axis in degrees - OpenGL coordinates
-    "Roll": [0.0],              #   float	y	degrees	The roll of the aircraft in degrees - OpenGL coordinates
-    "True Heading": [0.0],      #   float	y	degrees	The true heading of the aircraft in degrees from the Z axis - OpenGL coordinates
-    "Air Speed": [0.0],         #   float	y	knots	Indicated airspeed in knots, pilot. Writeable with override_IAS
-    "Vertical Air Speed": [0.0] #	float	y	feet/minute	Indicated vertical speed in feet per minute, pilot system.
-}
-
-# Updates metrics as y-axis for graphs
-def updateMetrics(measurement, array, slot):
-    
-    # Add current measurement to that array's metric
-    if (measurement == "Altitude"):
-        metrics[measurement].append(array[slot]*3.28084) # Altitude is pulled in meters so convert to feet
-    else:
-        metrics[measurement].append(array[slot])
-    
-    # Limit data points to the configured limit
-    if len(metrics[measurement]) > dataLimit:
-        metrics[measurement] = metrics[measurement][-dataLimit:]
-
-# Updates real-time as x-axis for graphs
-def updateTime():
 
-    # Adds sampling sleepd to the time vector -- continuous time
-    if len(passingTime) == 0:
-        passingTime.append(0.0)  # Start with time 0
-    else:
-        passingTime.append(passingTime[-1] + timeInterval)
+# Channels derived from each sample as it arrives (attitude rates); only the sampled CHANNELS are logged
+derived = ChannelPipeline(CHANNELS, attitudeRates())
 
-# Ensure lengths of passingTime and metric lists are equal before plotting (prevents errors)
-def synchronizeLengths():
+# All measurable metrics: the last dataLimit samples at full resolution, plus min/max/mean tiers for the rest of the session
+metrics = TieredHistory(derived.channels, dataLimit)
 
-    # Find the minimum length among passingTime and all metric lists in the metrics dictionary
-    minLength = min(len(passingTime), *[len(v) for v in metrics.values()])
+# Creates the plots once; later frames only move the lines
+def createPlots():
+    global renderer
 
-    # If passingTime is longer than minLength, truncate it to the last minLength entries.
-    if len(passingTime) > minLength:
-        passingTime[:] = passingTime[-minLength:]  # Slice passingTime to keep only the last minLength entries.
+    axes = [ax1, ax2, ax3, ax4, ax5, ax6, ax7, ax8]
+    renderer = PanelRenderer(fig, canvas, metrics, [(ax,) + plot for ax, plot in zip(axes, PANEL_PLOTS)])
 
-    # Iterate through each metric in the metrics dictionary.
-    for key in metrics.keys():
+# Monitors plane's position and air data until stopped or disconnected
+def monitor():
+    global sampler
 
-        # If the length of the current metric list is longer than minLength, truncate it.
-        if len(metrics[key]) > minLength:
-            metrics[key] = metrics[key][-minLength:]  # Slice the metric list to keep only the last minLength entries.
+    try:
+        # Sample on the position and air data schedules; every sample is also queued for the session log.
+        # One sampler serves the whole session, so its clock and timings carry on across reconnects
+        if sampler is None:
+            sampler = Sampler(client, timeInterval, airDataInterval, sessionWriter, timingInterval, onMissed=reportMissed)
+        else:
+            sampler.connect(client)
+        sampler.run(stopEvent, onSample=processSample)
 
-# Create and update a plot
-def createPlot(ax, title, ylabel, measurement):
+    # Log errors and set to disconnected
+    except Exception as e:
+        print(f"Error in data retrieval: {e}")
 
-    ax.clear() # Clear graph
+        logEvent(EVENT_DISCONNECTED)
 
-    # Ensure there's data to plot
-    if len(passingTime) > 1 and len(metrics[measurement]) > 1:
-        ax.plot(passingTime, metrics[measurement], label=measurement)
-        #ax.set_xlim(min(passingTime), max(passingTime))  # Dynamically expand x-axis
+        runOnMain(lbConnectionStatus.set, "Disconnected")  # Update the label status
+        runOnMain(btnReconnect.config, state=NORMAL)  # Enable reconnect button
 
-    # Configure graph
-    ax.set_title(title)
-    ax.set_xlabel("Time (s)")
-    ax.set_ylabel(ylabel)
-    ax.grid(True)
+# Derives the rates from one sample, records every metric, grades it and hands it to the render loop
+def processSample(sampleTime, row):
+    row = derived.process(sampleTime, row)
+    metrics.append(sampleTime, row)
 
-# Monitors plane's position and controls, updating the display every second
-def monitor():
-    global client, maneuver
+    # Grade any active maneuver against the new sample
+    maneuverEngine.update(row, sampleTime)
 
-    lastUpdateTime = time.perf_counter()  # Track time in seconds
+    # Hand the new data to the render loop
+    latestSnapshot.publish(metrics.snapshot())
 
-    #Check if the thread was terminated
-    while not stopEvent.is_set(): 
+# Prints the range and mean of every plotted metric over the session, read from the decimated history
+def printSessionSummary():
+    for title, ylabel, measurement in PANEL_PLOTS:
+        summary = metrics.summary(measurement)
+        if summary is not None:
+            low, high, mean = summary
+            print(f"{measurement}: min {low:.2f}, max {high:.2f}, mean {mean:.2f}")
 
-        try:
 
-            # Update current time and calculate how much time has passed
-            currentTime = time.perf_counter()
-            elapsedTime = currentTime - lastUpdateTime
-
-            # Only update metrics/graphs if the interval has passed
-            if elapsedTime >= timeInterval:  
-
-                # Get plane's position, calculated airspeed, and vertical airspeed
-                position = client.getPOSI()
-                airSpeed = client.getDREF("sim/cockpit2/gauges/indicators/airspeed_kts_pilot")
-                verticalSpeed = client.getDREF("sim/cockpit2/gauges/indicators/vvi_fpm_pilot")
-
-                # Update position and control metrics
-                updateMetrics("Latitude", position, 0)
-                updateMetrics("Longitude", position, 1)
-                updateMetrics("Altitude", position, 2)
-                updateMetrics("Pitch", position, 3)
-                updateMetrics("Roll", position, 4)
-                updateMetrics("True Heading", position, 5)
-                updateMetrics("Air Speed", airSpeed, 0)
-                updateMetrics("Vertical Air Speed", verticalSpeed, 0)
-
-                updateTime() # Update time axis
-                synchronizeLengths()  # Ensure lists are the same length before plotting
-                storeData() # Store updated metrics in a txt file
-
-                # Update the plots with new data
-                createPlot(ax1, "Vertical Air Speed", "Vertical Airspeed (ft per min)", "Vertical Air Speed")
-                createPlot(ax2, "Position (Latitude)", "Latitude (degrees)", "Latitude")
-                createPlot(ax3, "Pitch Rate", "Pitch (degrees)", "Pitch")
-                createPlot(ax4, "Yaw Rate", "Heading (degrees)", "True Heading")
-                createPlot(ax5, "Air Speed", "Air Speed (kt)", "Air Speed")
-                createPlot(ax6, "Position (Longitude)", "Longitude (degrees)", "Longitude")
-                createPlot(ax7, "Roll Rate", "Roll (degrees)", "Roll")
-                createPlot(ax8, "Altitude", "Altitude (ft above MSL)", "Altitude")
-
-                canvas.draw() # Redraw the canvas 
-
-                lastUpdateTime = currentTime  # Update the last update time
-
-                if(endManeuverFlag == True):
-                    endManeuverThread()
-
-        # Log errors and set to disconnected
-        except Exception as e:
-            print(f"Error in data retrieval: {e}")
+# Feeds a recorded session through the metrics, plots and maneuver checks instead of a live simulator.
+# Every recorded maneuver is started again in the maneuver engine with its recorded targets, so it is
+# regraded with the current tolerances; the recorded and regraded outcomes are shown side by side
+def replay():
+    global lastOutcome
 
-            with open(dataFile, "a") as f: 
-                f.write("\n--- Server Disconnected ---\n\n")
+    try:
+        with SessionLogReader(replayFile) as reader:
+            start, stop = reader.sessions()[replaySession]
+            samples = 0
+            pendingStart = None  # A maneuver recorded before any sample, started on the first one
+            recorded = None  # The last maneuver event recorded
+            startTime = time.perf_counter()
+
+            for record in reader.replay(start, stop, replaySpeed, stopEvent):
+                if record["type"] == RECORD_SAMPLE:
+                    row = record["values"][:len(CHANNELS)]
+                    if pendingStart is not None:
+                        maneuverEngine.start(pendingStart[0], row.tolist(), pendingStart[1], **pendingStart[2])
+                        pendingStart = None
+                    processSample(float(record["time"]), row)
+                    samples += 1
+
+                elif record["type"] == RECORD_EVENT:
+                    code, sampleTime = record["code"], float(record["time"])
+
+                    # Regrade a recorded maneuver from the last sample before it started
+                    if code == EVENT_MANEUVER_START:
+                        values = record["values"].tolist()
+                        targets = dict((field, value) for field, value in zip(TARGET_FIELDS, values) if not math.isnan(value))
+                        maneuverEngine.stop(sampleTime)
+                        lastOutcome = None
+                        recorded = eventText(code, record["arg"])
+                        if metrics.count:
+                            maneuverEngine.start(MANEUVERS[record["arg"]], metrics.latestRow(), sampleTime, **targets)
+                        else:
+                            pendingStart = (MANEUVERS[record["arg"]], sampleTime, targets)
+                        runOnMain(lbManeuverStatus.set, "Recorded: " + recorded)
+
+                    # A maneuver the regrade has not decided when the recording ended it ends as if by hand
+                    elif code in (EVENT_MANEUVER_PASSED, EVENT_MANEUVER_FAILED, EVENT_DISCONNECTED, EVENT_SESSION_END):
+                        maneuverEngine.stop(sampleTime)
+                        pendingStart = None
+                        if code != EVENT_DISCONNECTED and code != EVENT_SESSION_END:
+                            recorded = eventText(code, record["arg"])
+                            runOnMain(lbManeuverStatus.set, f"Recorded: {recorded}   Regraded: {lastOutcome or 'not decided'}")
+
+            # The log ended while a maneuver was still being flown, so neither outcome is known
+            if maneuverEngine.active or pendingStart is not None:
+                runOnMain(lbManeuverStatus.set, f"Recorded: {recorded}   Regraded: not decided")
+
+            elapsedTime = time.perf_counter() - startTime
+            print(f"Replayed {samples} samples in {elapsedTime:.2f} s ({samples / max(elapsedTime, 1e-9):.1f} samples/s)")
+            printSessionSummary()
+            runOnMain(lbConnectionStatus.set, "Replay Finished")
 
-            with open(csvDataFile, "a") as csvfile:
-                newCSVFile = csv.writer(csvfile)
-                newCSVFile.writerow(['\n--- Server Disconnected ---\n\n'])
+    except Exception as e:
+        print(f"Error in replay: {e}")
+        runOnMain(lbConnectionStatus.set, "Replay Failed")
 
-            lbConnectionStatus.set("Disconnected")  # Update the label status
-            btnReconnect.config(state=NORMAL)  # Enable reconnect button
+# Starts replaying replayFile in a separate thread
+def startReplayThread():
+    global monitorThread
 
-            break  # Exit the loop
+    metrics.clear()
+    derived.reset()
+    speed = f"{replaySpeed:g}x" if replaySpeed else "max speed"
+    lbConnectionStatus.set(f"Replaying {replayFile} ({speed})")
+    btnReconnect.config(state=DISABLED)  # Nothing to reconnect to
 
+    monitorThread = Thread(target=replay, daemon=True)
+    monitorThread.start()
 
 # Function to reconnect to X-Plane
 def reconnect():
-    global client, passingTime, metrics, maneuver, endManeuverFlag
+    global client
 
     try:
 
@@ -178,16 +179,15 @@ def reconnect():
         lbConnectionStatus.set("Connected")  # Update label to connected
         btnReconnect.config(state=DISABLED)  # Disable reconnect button
 
-        # Reset metrics and passingTime
-        passingTime = [0.0]  # Reset time
-        for key in metrics.keys():
-            metrics[key] = [0.0]  # Reset metrics to starting values
+        # End any maneuver, then reset metrics and their time axis
+        maneuverEngine.stop(metrics.latestTime())
+        metrics.clear()
+        derived.reset()
+        latestSnapshot.clear()
 
-        endManeuverFlag = True
-        lbManeuverStatus.set("Maneuver Status: Not Started")       
+        runOnMain(lbManeuverStatus.set, "Maneuver Status: Not Started")
         btnEndManeuver.config(state=DISABLED)
         enableManeuverButtons()
-        endManeuverThread()
 
         # Start the monitor thread again
         startMonitorThread()
@@ -206,9 +206,36 @@ def startMonitorThread():
         monitorThread = Thread(target=monitor, daemon=True)
         monitorThread.start()
 
+# Asks the main thread to call func(*args, **kwargs); Tk widgets must only be touched from there
+def runOnMain(func, *args, **kwargs):
+    uiCalls.put((func, args, kwargs))
+
+# Applies pending widget updates and draws the newest snapshot, then schedules the next frame
+def renderFrame():
+
+    # Apply every widget update queued since the last frame
+    while True:
+        try:
+            func, args, kwargs = uiCalls.get_nowait()
+        except queue.Empty:
+            break
+        func(*args, **kwargs)
+
+    # Draw only the latest data; anything published in between is skipped
+    snapshot = latestSnapshot.take()
+    if snapshot is not None:
+        renderer.update(snapshot)
+
+        # Refresh the timing readout
+        if sampler is not None:
+            lbTiming.set(sampler.timingText())
+
+    if not stopEvent.is_set():
+        display.after(int(1000 / frameRate), renderFrame)
+
 # Handler for window close event
 def onClosing():
-    global monitorThread, maneuver
+    global monitorThread
 
     stopEvent.set()  # Set the stop event to terminate threads
 
@@ -219,57 +246,43 @@ def onClosing():
             print("Warning: Monitor thread did not finish in time. Terminating forcefully.")
             monitorThread = None  # Set monitorThread to None after termination
 
-    # Check if the maneuver thread is still running
-    endManeuverThread()
+    # End any maneuver still being flown and summarise the session
+    maneuverEngine.stop(metrics.latestTime())
+    printSessionSummary()
 
-    # Close the text file and add a partition line
-    with open(dataFile, "a") as f:  # Open the file in append mode
-        f.write("\n--- End of Session ---\n\n")  # Add a partition line
-    
-    with open(csvDataFile, "w", newline='') as csvFile:  # Open the file in append mode
-        newCSVFile = csv.writer(csvFile)  
-        newCSVFile.writerow('\n--- End of Session ---\n\n') # Add a partition line
+    # Mark the end of the session, write out anything still queued and close the log
+    if sessionWriter is not None:
+        if sampler is not None:
+            sampler.writeTimings()
+        sessionWriter.writeEvent(EVENT_SESSION_END, sampleTime=metrics.latestTime())
+        try:
+            sessionWriter.close()
+        except Exception as e:
+            print(f"Error writing {logFile}: {e}")
+        if sessionWriter.droppedRecords:
+            print(f"Warning: {sessionWriter.droppedRecords} records were dropped")
+
+        # Export this session to the text and CSV logs
+        exportText(logFile, dataFile, start=sessionWriter.sessionStart)
+        exportCSV(logFile, csvDataFile, start=sessionWriter.sessionStart)
 
     display.quit()  # Close the Tkinter window
     os._exit(0)  # Forcefully terminate the process
 
-def storeData():
-    # Check if the file exists to determine if we need to write the header
-    file_exists = os.path.isfile(dataFile)
-    file_exists1 = os.path.isfile(csvDataFile)
-
-    with open(dataFile, 'a') as file:  # Open in append mode
-        # Write header only if the file is new
-        if not file_exists:
-            header = "Timestamp," + ",".join(metrics.keys()) + "\n"
-            file.write(header)
-
-        # Write a timestamp for the current data entry
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        # Collect the latest values in the same order as the header
-        latest_values = [metrics[metric][-1] for metric in metrics.keys()]
-        # Create a row for the data
-        data_row = f"{timestamp}," + ",".join(map(str, latest_values)) + "\n"
-        file.write(data_row)  # Append the data row to the file
-
-    with open(csvDataFile, "a", newline= '') as csvFile:  # Open the file in write mode
-        newCSVFile = csv.writer(csvFile)
-        
-        if not file_exists1:
-            header = ['Timestamp'] + list(metrics.keys())
-            newCSVFile.writerow(header)
-       
-        # Write a timestamp for the current data entry
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        row = [timestamp] + [metrics[metric][-1] for metric in metrics.keys()] # combine timestamp and metric values
-        newCSVFile.writerow(row)  # Append the data row to the file
-        
-    print(f"Data written to {csvDataFile}")
-# Ends maneuver test
-def toggleManeuver():
-    global endManeuverFlag
-
-    endManeuverFlag = not endManeuverFlag
+# Queues an event for the background writer; replays are not logged again
+def logEvent(code, maneuverName=None, values=None):
+    if sessionWriter is not None:
+        sessionWriter.writeEvent(code, maneuverName, metrics.latestTime(), values)
+
+# Logs the deviation statistics an ended maneuver collected, one record per quantity, for the debrief
+def logManeuverStats(active, sampleTime):
+    if sessionWriter is not None:
+        for channel, stats in active.statistics.items():
+            sessionWriter.writeManeuverStats(active.name, channel, stats.summary(), sampleTime)
+
+# Ends the active maneuver by hand
+def endManeuver():
+    maneuverEngine.stop(metrics.latestTime())
 
 def enableManeuverButtons():
     btnConstantClimbs.config(state=NORMAL)
@@ -283,121 +296,46 @@ def disableManeuverButtons():
     btnStraightFlight.config(state=DISABLED)
     btnTurnsToHeadings.config(state=DISABLED)
 
-def endManeuverThread():
-    # Check if the maneuver thread is still running
-    if maneuver.is_alive():  
-        maneuver.join(timeout=1)  # Wait for 1 second
-        if maneuver.is_alive():
-            print("Warning: Maneuver thread did not finish in time.")
-
-# Initiate straight and level flight thread
-def straightAndLevel():
-    global maneuver, maneuverStartAltitude, maneuverStartHeading, maneuverStartAirspeed, endManeuverFlag
-
-    try:
-
-        # Document that the test is initaited
-        with open(dataFile, "a") as f: 
-            f.write("\n--- Straight-and-Level Flight ---\n\n") 
-        
-        with open(csvDataFile, "w", newline='') as csvfile: 
-            newCSVFile = csv.writer(csvfile)
-            newCSVFile.writerow(['\n--- Straight-and-Level Flight ---\n\n']) 
-
-        lbManeuverStatus.set("Maneuver Status: Straight-and-Level Flight Initiated") 
-
-        endManeuverFlag = False
+# Starts grading a maneuver against the latest sample; the engine checks every following sample
+def startManeuver(name, **targets):
 
-        # Capture initial values
-        maneuverStartAltitude = metrics["Altitude"][-1]
-        maneuverStartHeading = metrics["True Heading"][-1]
-        maneuverStartAirspeed = metrics["Air Speed"][-1]
+    # Document that the test is initiated, with its targets so it can be regraded later
+    logEvent(EVENT_MANEUVER_START, name, [targets.get(field, float("nan")) for field in TARGET_FIELDS])
 
-        # Thread runs if stop event isn't called
-        if not stopEvent.is_set():
-            maneuver = Thread(target=performStraightAndLevel, daemon=True)
-            maneuver.start()
-            
-    except Exception as e:
-        print(f"Error in Straight-and-Level Flight: {e}")
-
-# Evaluates straight and level maneuver
-def performStraightAndLevel():
-    global maneuver, endManeuverFlag
+    lbManeuverStatus.set(f"Maneuver Status: {name} Initiated")
     btnEndManeuver.config(state=NORMAL)
     disableManeuverButtons()
-    failed = False
 
-    try:
-        # Continuous check for altitude until maneuver is stopped
-        while not stopEvent.is_set():
-            # Ends maneuver manually
-            if (endManeuverFlag == True):
-                break
-
-            currentAltitude = metrics["Altitude"][-1]
-            currentHeading =  metrics["True Heading"][-1]
-            currentAirspeed = metrics["Air Speed"][-1]
-
-            # Check altitude error range
-            if (currentAltitude > maneuverStartAltitude + altitudeError or
-                currentAltitude < maneuverStartAltitude - altitudeError):
-                lbManeuverStatus.set("Maneuver Status: Straight-and-Level Flight Maneuver failed (Altitude)")  
-                failed = True
-                break  # Exit the loop if the altitude is not maintained
-
-            # Check heading error range
-            if (currentHeading > maneuverStartHeading + headingError or
-                currentHeading < maneuverStartHeading - headingError):
-                lbManeuverStatus.set("Maneuver Status: Straight-and-Level Flight Maneuver failed (Heading)")  
-                failed = True
-                break  # Exit the loop if the altitude is not maintained
-
-            # Check airspeed error range
-            if (currentAirspeed > maneuverStartAirspeed + airspeedError or
-                currentAirspeed < maneuverStartAirspeed - airspeedError):
-                lbManeuverStatus.set("Maneuver Status: Straight-and-Level Flight Maneuver failed (Airspeed)")  
-                failed = True
-                break  # Exit the loop if the altitude is not maintained
-
-            time.sleep(timeInterval)  # Allow monitor thread to run smoothly
-            
-    except Exception as e:
-        print(f"Error in evaluating Straight-and-Level Flight: {e}")
+    maneuverEngine.start(name, metrics.latestRow(), metrics.latestTime(), **targets)
 
-    finally:
-                
-        if(not failed):
-            lbManeuverStatus.set("Maneuver Status: Straight-and-Level Flight Maneuver Passed") 
+# Called by the maneuver engine on the sampling thread when a maneuver passes, fails or is ended
+def maneuverEnded(active, passed, reason, sampleTime):
+    global lastOutcome
 
-            with open(dataFile, "a") as f: 
-                f.write("\n--- Straight-and-Level Flight Ended (Passed) ---\n\n")
-        
-        else:
-            with open(dataFile, "a") as f: 
-                f.write("\n--- Straight-and-Level Flight Ended (Failed) ---\n\n")
+    lastOutcome = f"{active.name} Passed" if passed else f"{active.name} Failed ({reason})"
+    runOnMain(lbManeuverStatus.set, f"Maneuver Status: {lastOutcome}")
+    logEvent(EVENT_MANEUVER_PASSED if passed else EVENT_MANEUVER_FAILED, active.name)
+    logManeuverStats(active, sampleTime)
 
-        endManeuverFlag = False
-        btnEndManeuver.config(state=DISABLED)
-        enableManeuverButtons()
-
-# Initiate constant climbs thread
-def constantClimbs():
-    global maneuver, maneuverStartAltitude, maneuverStartHeading, maneuverStartAirspeed, targetAltitude, endManeuverFlag
+    runOnMain(btnEndManeuver.config, state=DISABLED)
+    runOnMain(enableManeuverButtons)
 
+# Initiate straight and level flight
+def straightAndLevel():
     try:
+        startManeuver("Straight-and-Level Flight")
 
-        # Capture initial values
-        maneuverStartAltitude = metrics["Altitude"][-1]
-        maneuverStartHeading = metrics["True Heading"][-1]
-        maneuverStartAirspeed = metrics["Air Speed"][-1]
+    except Exception as e:
+        print(f"Error in Straight-and-Level Flight: {e}")
 
-        endManeuverFlag = False 
+# Initiate constant climbs
+def constantClimbs():
+    try:
 
         try:
             targetAltitude = float(entryTargetAltitude.get())
 
-            if(targetAltitude < maneuverStartAltitude):
+            if(targetAltitude < metrics.latest("Altitude")):
 
                 print("Invalid input for target altitude")
                 return
@@ -406,97 +344,19 @@ def constantClimbs():
             print("Invalid input for target altitude")
             return
 
-        # Document that the test is initiated
-        with open(dataFile, "a") as f:
-            f.write("\n--- Constant Airspeed Climbs ---\n\n")
-
-        lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Initiated")
-
-        # Thread runs if stop event isn't called
-        if not stopEvent.is_set():
-            maneuver = Thread(target=performConstantClimbs, daemon=True)
-            maneuver.start()
+        startManeuver("Constant Airspeed Climbs", altitude=targetAltitude)
 
     except Exception as e:
         print(f"Error in Constant Airspeed Climbs: {e}")
 
-# Evaluates constant airspeed climbs
-def performConstantClimbs():
-    global maneuver, endManeuverFlag
-    btnEndManeuver.config(state=NORMAL)
-    disableManeuverButtons()
-    failed = False
-
-    try:
-        # Continuous check for altitude until maneuver is stopped
-        while not stopEvent.is_set():
-            # Ends maneuver manually -- test ended before pilot reached altitude
-            if endManeuverFlag:
-                failed = True
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Failed (Aborted)")
-                break
-
-            currentAltitude = metrics["Altitude"][-1]
-            currentHeading = metrics["True Heading"][-1]
-            currentAirspeed = metrics["Air Speed"][-1]
-
-            # Check if the plane leveled off within the altitude error range
-            if (targetAltitude - altitudeError <= currentAltitude <= targetAltitude + altitudeError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Passed")
-
-                # End the climb when target altitude is reached
-                break
-
-            # Check heading error range
-            if (currentHeading > maneuverStartHeading + headingError or
-                currentHeading < maneuverStartHeading - headingError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Failed (Heading)")
-                failed = True
-                break
-
-            # Check airspeed error range
-            if (currentAirspeed > maneuverStartAirspeed + airspeedError or
-                currentAirspeed < maneuverStartAirspeed - airspeedError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Failed (Airspeed)")
-                failed = True
-                break
-
-            time.sleep(timeInterval)  # Allow monitor thread to run smoothly
-
-    except Exception as e:
-        print(f"Error in evaluating Constant Airspeed Climbs: {e}")
-
-    finally:
-        if not failed:
-            lbManeuverStatus.set("Maneuver Status: Constant Airspeed Climbs Passed")
-            with open(dataFile, "a") as f:
-                f.write("\n--- Constant Airspeed Climbs Ended (Passed) ---\n\n")
-        else:
-            with open(dataFile, "a") as f:
-                f.write("\n--- Constant Airspeed Climbs Ended (Failed) ---\n\n")
-
-        endManeuverFlag = False
-        btnEndManeuver.config(state=DISABLED)
-        enableManeuverButtons()
-
-# Initiate constant desc thread
+# Initiate constant descents
 def constantDescents():
-    
-    global maneuver, maneuverStartAltitude, maneuverStartHeading, maneuverStartAirspeed, targetAltitude, endManeuverFlag
-
     try:
 
-        # Capture initial values
-        maneuverStartAltitude = metrics["Altitude"][-1]
-        maneuverStartHeading = metrics["True Heading"][-1]
-        maneuverStartAirspeed = metrics["Air Speed"][-1]
-
-        endManeuverFlag = False 
-
         try:
             targetAltitude = float(entryTargetAltitude.get())
 
-            if(targetAltitude > maneuverStartAltitude):
+            if(targetAltitude > metrics.latest("Altitude")):
 
                 print("Invalid input for target altitude")
                 return
@@ -505,92 +365,15 @@ def constantDescents():
             print("Invalid input for target altitude")
             return
 
-        # Document that the test is initiated
-        with open(dataFile, "a") as f:
-            f.write("\n--- Constant Airspeed Descents ---\n\n")
-
-        lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Initiated")
-
-        # Thread runs if stop event isn't called
-        if not stopEvent.is_set():
-            maneuver = Thread(target=performConstantDescents, daemon=True)
-            maneuver.start()
+        startManeuver("Constant Airspeed Descents", altitude=targetAltitude)
 
     except Exception as e:
         print(f"Error in Constant Airspeed Descents: {e}")
 
-# Evaluates constant airspeed descents
-def performConstantDescents():
-    global maneuver, endManeuverFlag
-    btnEndManeuver.config(state=NORMAL)
-    disableManeuverButtons()
-    failed = False
-
-    try:
-        # Continuous check for altitude until maneuver is stopped
-        while not stopEvent.is_set():
-            # Ends maneuver manually -- test ended before pilot reached altitude
-            if endManeuverFlag:
-                failed = True
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Failed (Aborted)")
-                break
-
-            currentAltitude = metrics["Altitude"][-1]
-            currentHeading = metrics["True Heading"][-1]
-            currentAirspeed = metrics["Air Speed"][-1]
-
-            # Check if the plane leveled off within the altitude error range
-            if (targetAltitude + altitudeError <= currentAltitude <= targetAltitude - altitudeError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Passed")
-
-                # End the climb when target altitude is reached
-                break
-
-            # Check heading error range
-            if (currentHeading > maneuverStartHeading + headingError or
-                currentHeading < maneuverStartHeading - headingError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Failed (Heading)")
-                failed = True
-                break
-
-            # Check airspeed error range
-            if (currentAirspeed > maneuverStartAirspeed + airspeedError or
-                currentAirspeed < maneuverStartAirspeed - airspeedError):
-                lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Failed (Airspeed)")
-                failed = True
-                break
-
-            time.sleep(timeInterval)  # Allow monitor thread to run smoothly
-
-    except Exception as e:
-        print(f"Error in evaluating Constant Airspeed Descents: {e}")
-
-    finally:
-        if not failed:
-            lbManeuverStatus.set("Maneuver Status: Constant Airspeed Descents Passed")
-            with open(dataFile, "a") as f:
-                f.write("\n--- Constant Airspeed Descents Ended (Passed) ---\n\n")
-        else:
-            with open(dataFile, "a") as f:
-                f.write("\n--- Constant Airspeed Descents Ended (Failed) ---\n\n")
-
-        endManeuverFlag = False
-        btnEndManeuver.config(state=DISABLED)
-        enableManeuverButtons()
-
-# Initiate turns to heading thread
+# Initiate turns to headings
 def turnsToHeadings():
-    global maneuver, maneuverStartAltitude, maneuverStartHeading, maneuverStartAirspeed, targetHeading, endManeuverFlag
-
     try:
 
-        # Capture initial values
-        maneuverStartAltitude = metrics["Altitude"][-1]
-        maneuverStartHeading = metrics["True Heading"][-1]
-        maneuverStartAirspeed = metrics["Air Speed"][-1]
-
-        endManeuverFlag = False 
-
         try:
             targetHeading = float(entryTargetHeading.get())
 
@@ -603,94 +386,35 @@ def turnsToHeadings():
             print("Invalid input for target heading")
             return
 
-        # Document that the test is initiated
-        with open(dataFile, "a") as f:
-            f.write("\n--- Turns to Headings ---\n\n")
-
-        lbManeuverStatus.set("Maneuver Status: Turns to Headings Initiated")
-
-        # Thread runs if stop event isn't called
-        if not stopEvent.is_set():
-            maneuver = Thread(target=performTurnsToHeadings, daemon=True)
-            maneuver.start()
+        startManeuver("Turns to Headings", heading=targetHeading)
 
     except Exception as e:
         print(f"Error in Turns to Headings: {e}")
 
-# Evaluates turns to headings
-def performTurnsToHeadings():
-    global maneuver, endManeuverFlag
-    btnEndManeuver.config(state=NORMAL)
-    disableManeuverButtons()
-    failed = False
-
-    try:
-        # Continuous check for heading until maneuver is stopped
-        while not stopEvent.is_set():
-            # Ends maneuver manually -- test ended before pilot reached altitude
-            if endManeuverFlag:
-                failed = True
-                lbManeuverStatus.set("Maneuver Status: Turns to Headings Failed (Aborted)")
-                break
-
-            currentAltitude = metrics["Altitude"][-1]
-            currentHeading = metrics["True Heading"][-1]
-            currentAirspeed = metrics["Air Speed"][-1]
-
-            # Check altitude error range
-            if (currentAltitude > maneuverStartAltitude + altitudeError or
-                currentAltitude < maneuverStartAltitude - altitudeError):
-                lbManeuverStatus.set("Maneuver Status: Turns to Headings failed (Altitude)")  
-                failed = True
-                break  # Exit the loop if the altitude is not maintained
-
-            # Check if the plane heading is within range
-            if (is_heading_in_range(currentHeading, targetHeading, headingError)):
-                lbManeuverStatus.set("Maneuver Status: Turns to Headings Passed")
-
-                # End the climb when target altitude is reached
-                break
-
-            # Check airspeed error range
-            if (currentAirspeed > maneuverStartAirspeed + airspeedError or
-                currentAirspeed < maneuverStartAirspeed - airspeedError):
-                lbManeuverStatus.set("Maneuver Status: Turns to Headings Failed (Airspeed)")
-                failed = True
-                break
-
-            time.sleep(timeInterval)  # Allow monitor thread to run smoothly
-
-    except Exception as e:
-        print(f"Error in evaluating Turns to Headings: {e}")
-
-    finally:
-        if not failed:
-            lbManeuverStatus.set("Maneuver Status: Turns to Headings Passed")
-            with open(dataFile, "a") as f:
-                f.write("\n--- Turns to Headings Ended (Passed) ---\n\n")
-        else:
-            with open(dataFile, "a") as f:
-                f.write("\n--- Turns to Headings Ended (Failed) ---\n\n")
-
-        endManeuverFlag = False
-        btnEndManeuver.config(state=DISABLED)
-        enableManeuverButtons()
-
-def is_heading_in_range(currentHeading, targetHeading, headingError):
-    # Normalize both headings to the range [0, 360)
-    normalized_current = currentHeading % 360
-    normalized_target = targetHeading % 360
-
-    # Calculate the shortest difference between headings
-    diff = (normalized_target - normalized_current + 360) % 360
-
-    # Check if within the headingError, either clockwise or counterclockwise
-    result = min(diff, 360 - diff) <= headingError
-
-    return result
+# Grades the maneuvers inline on every sample
+maneuverEngine = ManeuverEngine(metrics.channels, standardManeuvers(altitudeError, headingError, airspeedError),
+                                onEnd=maneuverEnded)
 
 if __name__ == "__main__":
 
+    # Command line options
+    parser = argparse.ArgumentParser(description="Instructor panel for X-Plane.")
+    parser.add_argument("--replay", metavar="LOG", help="replay a recorded session log instead of connecting to X-Plane")
+    parser.add_argument("--session", type=int, default=replaySession, help="session of the log to replay (default: the last)")
+    parser.add_argument("--speed", type=float, default=replaySpeed, help="replay speed as a multiple of real time, 0 for as fast as possible")
+    parser.add_argument("--fps", type=float, default=frameRate, help="display refreshes per second")
+    parser.add_argument("--rate", type=float, default=1 / timeInterval, help="position and attitude samples per second")
+    parser.add_argument("--air-rate", type=float, default=1 / airDataInterval, help="airspeed and vertical speed updates per second")
+    args = parser.parse_args()
+    replayFile, replaySession, replaySpeed, frameRate = args.replay, args.session, args.speed, args.fps
+    timeInterval, airDataInterval = 1 / args.rate, 1 / args.air_rate
+
+    # GUI modules are only loaded once the panel is actually shown; the sampling, logging and
+    # grading modules above work without them (see recorder.py)
+    from tkinter import *
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
     # Initialize Tkinter display
     display = Tk()
     display.geometry("1920x1080")
@@ -701,20 +425,13 @@ if __name__ == "__main__":
     # Initialize the matplotlib figure and subplots
     fig, ((ax1, ax2, ax3, ax4), (ax5, ax6, ax7, ax8)) = plt.subplots(2, 4, figsize=(16, 6))
     fig.suptitle('Instructor Panel')
-    fig.tight_layout(pad=3.0)
-
-    # Create initial plots
-    createPlot(ax1, "Vertical Air Speed", "Vertical Airspeed (ft per min)", "Vertical Air Speed")
-    createPlot(ax2, "Position (Latitude)", "Latitude (degrees)", "Latitude")
-    createPlot(ax3, "Pitch Rate", "Pitch (degrees)", "Pitch")
-    createPlot(ax4, "Yaw Rate", "Heading (degrees)", "True Heading")
-    createPlot(ax5, "Air Speed", "Air Speed (kt)", "Air Speed")
-    createPlot(ax6, "Position (Longitude)", "Longitude (degrees)", "Longitude")
-    createPlot(ax7, "Roll Rate", "Roll (degrees)", "Roll")
-    createPlot(ax8, "Altitude", "Altitude (ft above MSL)", "Altitude")
 
     # Create the canvas and add it to the Tkinter window
     canvas = FigureCanvasTkAgg(fig, master=display)
+
+    # Create initial plots
+    createPlots()
+    fig.tight_layout(pad=3.0)
     canvas.draw()
     canvas.get_tk_widget().pack(fill=BOTH, expand=True)
 
@@ -724,6 +441,11 @@ if __name__ == "__main__":
     lbStatus = Label(display, textvariable=lbConnectionStatus, font=("Arial", 14))
     lbStatus.pack(pady=10)
 
+    # Label to show request round trip times and sampling jitter
+    lbTiming = StringVar()
+    lbTimingStatus = Label(display, textvariable=lbTiming, font=("Arial", 10))
+    lbTimingStatus.pack()
+
     # Reconnect button
     btnReconnect = Button(display, text="Reconnect", command=reconnect, state=NORMAL)
     btnReconnect.pack(pady=10)
@@ -754,7 +476,7 @@ if __name__ == "__main__":
     entryTargetHeading.pack(pady=10)
 
     # End Maneuver button
-    btnEndManeuver = Button(display, text="End Maneuver", command=toggleManeuver, state=DISABLED)
+    btnEndManeuver = Button(display, text="End Maneuver", command=endManeuver, state=DISABLED)
     btnEndManeuver.pack(pady=10)
 
     # Maneuver status
@@ -763,8 +485,17 @@ if __name__ == "__main__":
     lblManeuverStatus = Label(display, textvariable=lbManeuverStatus, font=("Arial", 14))
     lblManeuverStatus.pack(pady=10)
 
-    # Start the initial connection and monitor thread
-    reconnect()
+    if replayFile:
+        # Replay a recorded session
+        startReplayThread()
+
+    else:
+        # Open the session logs
+        sessionWriter = SessionWriter(logFile, CHANNELS)
+
+        # Start the initial connection and monitor thread
+        reconnect()
     
-    # Start the Tkinter main loop
+    # Start drawing frames and the Tkinter main loop
+    renderFrame()
     display.mainloop()
\ No newline at end of file
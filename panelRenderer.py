@@ -0,0 +1,119 @@
+# The plots of the instructor panel: (title, ylabel, measurement), laid out two rows of four
+PANEL_PLOTS = [
+    ("Vertical Air Speed", "Vertical Airspeed (ft per min)", "Vertical Air Speed"),
+    ("Position (Latitude)", "Latitude (degrees)", "Latitude"),
+    ("Pitch Rate", "Pitch Rate (degrees per s)", "Pitch Rate"),
+    ("Yaw Rate", "Yaw Rate (degrees per s)", "Yaw Rate"),
+    ("Air Speed", "Air Speed (kt)", "Air Speed"),
+    ("Position (Longitude)", "Longitude (degrees)", "Longitude"),
+    ("Roll Rate", "Roll Rate (degrees per s)", "Roll Rate"),
+    ("Altitude", "Altitude (ft above MSL)", "Altitude"),
+]
+
+
+class PanelRenderer(object):
+    """Draws one line per axes from a `MetricsStore`, redrawing as little as possible.
+
+       Each axes gets its title, labels, grid and a single animated `Line2D` once, when the
+       renderer is created. An update only moves the data of the lines with `set_data` and
+       blits them over a cached background of the static parts of the figure. The expensive
+       full `canvas.draw()` only happens when an axis has to be rescaled: the x axis is
+       advanced in steps of `scrollStep` of its span rather than on every sample, and the y
+       axis only grows or shrinks when the data leave the view or occupy too little of it.
+    """
+    def __init__(self, figure, canvas, store, plots, scrollStep=0.25, margin=0.1):
+        """Creates the lines. The figure is drawn in full by the first `update` or `redraw`.
+
+            Args:
+              figure: The matplotlib figure holding the axes.
+              canvas: The canvas the figure is drawn on.
+              store: The `MetricsStore` to plot.
+              plots: A list of `(ax, title, ylabel, measurement)`, one per axes.
+              scrollStep: The fraction of the visible time span the x axis advances at a time.
+              margin: The fraction of the data range left free above and below the data.
+        """
+        self.figure = figure
+        self.canvas = canvas
+        self.store = store
+        self.scrollStep = scrollStep
+        self.margin = margin
+        self.background = None
+        self.fullRedraws = 0
+        self.blits = 0
+
+        self.lines = []
+        for ax, title, ylabel, measurement in plots:
+            ax.set_title(title)
+            ax.set_xlabel("Time (s)")
+            ax.set_ylabel(ylabel)
+            ax.grid(True)
+            line, = ax.plot([], [], label=measurement, animated=True)
+            self.lines.append((ax, line, measurement))
+
+        # Recapture the background whenever the whole figure is drawn, e.g. after a resize
+        self.canvas.mpl_connect("draw_event", self._onDraw)
+
+    def _onDraw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._drawLines()
+
+    def _drawLines(self):
+        for ax, line, measurement in self.lines:
+            ax.draw_artist(line)
+
+    def redraw(self):
+        """Draws the whole figure and caches its background."""
+        self.fullRedraws += 1
+        self.canvas.draw()
+
+    def update(self, snapshot=None):
+        """Moves every line to new data and draws the frame.
+
+            Args:
+              snapshot: A `(times, values)` tuple from `MetricsStore.snapshot()`. None plots the
+                current contents of the store, which must then not change during the call.
+        """
+        if snapshot is None:
+            # The store's views change under us as samples are appended, so plot copies
+            snapshot = self.store.snapshot()
+        times, columns = snapshot
+
+        rescaled = False
+        for ax, line, measurement in self.lines:
+            values = columns[self.store.columns[measurement]]
+            line.set_data(times, values)
+            if len(times) > 1:
+                rescaled |= self._scaleX(ax, times)
+                rescaled |= self._scaleY(ax, values)
+
+        if rescaled or self.background is None:
+            self.redraw()
+            return
+
+        self.blits += 1
+        self.canvas.restore_region(self.background)
+        self._drawLines()
+        self.canvas.blit(self.figure.bbox)
+
+    def _scaleX(self, ax, times):
+        """Advances the x axis by a whole step once the newest sample runs off the end."""
+        low, high = ax.get_xlim()
+        first, last = float(times[0]), float(times[-1])
+        if first >= low and last <= high and high - low > 0:
+            return False
+
+        span = max(last - first, 1e-9)
+        step = span * self.scrollStep
+        ax.set_xlim(first, last + step)
+        return True
+
+    def _scaleY(self, ax, values):
+        """Rescales the y axis when the data leave the view or fill under a quarter of it."""
+        low, high = ax.get_ylim()
+        smallest, largest = float(values.min()), float(values.max())
+        pad = max((largest - smallest) * self.margin, abs(largest) * 1e-3, 1e-6)
+        if smallest >= low and largest <= high and (largest - smallest + 2 * pad) * 4 >= high - low:
+            return False
+
+        ax.set_ylim(smallest - pad, largest + pad)
+        return True
@@ -0,0 +1,113 @@
+"""Headless recorder and grader for display-less machines.
+
+`record` samples one simulator into a session log with the same schedule, timestamps and
+timing summaries as the instructor panel, and keeps running as a service: it reconnects when
+the simulator goes away and stops cleanly on SIGINT or SIGTERM. `grade` regrades recorded
+sessions (see gradeSessions.py). No GUI module is imported.
+
+    python recorder.py record --log station1.xpclog --rate 20 --air-rate 5
+    python recorder.py grade logs/*.xpclog --altitude-error 150
+"""
+import argparse
+import signal
+import sys
+from threading import Event, Timer
+
+import xpc
+from sampling import Sampler, CHANNELS, reportMissed
+from sessionLog import SessionWriter, exportText, exportCSV, EVENT_DISCONNECTED, EVENT_SESSION_END
+
+
+def record(args):
+    """Records until stopped, the duration elapses or, without --retry, the simulator is lost."""
+    stopEvent = Event()
+    for signalNumber in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signalNumber, lambda number, frame: stopEvent.set())
+
+    writer = SessionWriter(args.log, CHANNELS, fsync=args.fsync)
+    if args.duration:
+        timer = Timer(args.duration, stopEvent.set)
+        timer.daemon = True
+        timer.start()
+
+    sampler = None
+    try:
+        while not stopEvent.is_set():
+            try:
+                with xpc.XPlaneConnect(args.host, args.xp_port, args.port, args.timeout) as client:
+                    # One sampler for the whole recording keeps the session clock and timings going across reconnects
+                    if sampler is None:
+                        sampler = Sampler(client, 1 / args.rate, 1 / args.air_rate, writer, args.timing_interval,
+                                          onMissed=reportMissed)
+                    else:
+                        sampler.connect(client)
+                    print(f"Recording {args.host}:{args.xp_port} to {args.log}", flush=True)
+                    sampler.run(stopEvent, onSample=lambda sampleTime, row: printStatus(sampler, args))
+            except Exception as e:
+                print(f"Error in data retrieval: {e}", file=sys.stderr, flush=True)
+                writer.writeEvent(EVENT_DISCONNECTED, sampleTime=sampler.sampleTime if sampler else 0.0)
+                if not args.retry:
+                    break
+
+                # Wait before trying the simulator again
+                stopEvent.wait(args.retry)
+
+    finally:
+        if sampler is not None:
+            sampler.writeTimings()
+            print(sampler.timingText(), flush=True)
+        writer.writeEvent(EVENT_SESSION_END, sampleTime=sampler.sampleTime if sampler else 0.0)
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"Error writing {args.log}: {e}", file=sys.stderr)
+        if writer.droppedRecords:
+            print(f"Warning: {writer.droppedRecords} records were dropped", file=sys.stderr)
+
+        # Export this session to the text and CSV logs
+        if args.text:
+            exportText(args.log, args.text, start=writer.sessionStart)
+        if args.csv:
+            exportCSV(args.log, args.csv, start=writer.sessionStart)
+    return 0
+
+
+def printStatus(sampler, args):
+    """Prints the timing readout every `args.status` samples."""
+    if args.status and sampler.samples % args.status == 0:
+        print(f"{sampler.samples} samples   {sampler.timingText()}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and grade X-Plane sessions without a display.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recorder = commands.add_parser("record", help="record a simulator to a session log")
+    recorder.add_argument("--log", default="data.xpclog", help="session log to append to")
+    recorder.add_argument("--host", default="localhost", help="machine running X-Plane")
+    recorder.add_argument("--xp-port", type=int, default=49009, help="port of the XPC plugin")
+    recorder.add_argument("--port", type=int, default=0, help="local port (default: any free port)")
+    recorder.add_argument("--timeout", type=int, default=100, help="request timeout in milliseconds")
+    recorder.add_argument("--rate", type=float, default=4.0, help="position and attitude samples per second")
+    recorder.add_argument("--air-rate", type=float, default=4.0, help="airspeed and vertical speed updates per second")
+    recorder.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    recorder.add_argument("--retry", type=float, default=5.0, help="seconds between reconnection attempts, 0 to exit instead")
+    recorder.add_argument("--timing-interval", type=float, default=10.0, help="seconds between timing summaries in the log")
+    recorder.add_argument("--status", type=int, default=0, help="print the timing readout every N samples")
+    recorder.add_argument("--fsync", action="store_true", help="fsync the log after every flush")
+    recorder.add_argument("--text", default=None, help="also export the session to this text log when done")
+    recorder.add_argument("--csv", default=None, help="also export the session to this CSV log when done")
+
+    commands.add_parser("grade", help="regrade recorded sessions (see gradeSessions.py)", add_help=False)
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["grade"]:
+        import gradeSessions
+        return gradeSessions.main(argv[1:])
+
+    args = parser.parse_args(argv)
+    return record(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+import sys
+import time
+from bisect import bisect_right
+from threading import Lock
+
+import numpy
+
+from derivedChannels import ChannelPipeline, unitConversions
+
+# The channels sampled from X-Plane by the panels, in the order of each sample
+CHANNELS = [
+    # "Time Stamp",         #   year-mon-day hour:min:sec
+    "Latitude",             #	double	n	degrees	The latitude of the aircraft
+    "Longitude",            #   double	n	degrees	The longitude of the aircraft
+    "Altitude",             #   double	n	feet	The elevation above MSL of the aircraft (X-Plane reports meters)
+    "Pitch",                #   float	y	degrees	The pitch relative to the plane normal to the Y axis in degrees - OpenGL coordinates
+    "Roll",                 #   float	y	degrees	The roll of the aircraft in degrees - OpenGL coordinates
+    "True Heading",         #   float	y	degrees	The true heading of the aircraft in degrees from the Z axis - OpenGL coordinates
+    "Air Speed",            #   float	y	knots	Indicated airspeed in knots, pilot. Writeable with override_IAS
+    "Vertical Air Speed"    #	float	y	feet/minute	Indicated vertical speed in feet per minute, pilot system.
+]
+
+# Datarefs fetched alongside the position for each sample
+SNAPSHOT_DREFS = ["sim/cockpit2/gauges/indicators/airspeed_kts_pilot",
+                  "sim/cockpit2/gauges/indicators/vvi_fpm_pilot"]
+
+
+# Converts each sample from the units X-Plane reports to those of CHANNELS
+_CONVERSIONS = ChannelPipeline(CHANNELS, unitConversions())
+
+
+def sampleRow(position, airSpeed, verticalSpeed):
+    """Builds one sample of CHANNELS from a `getPOSI` result and the SNAPSHOT_DREFS values."""
+    return _CONVERSIONS.process(0.0, (position[0],      # Latitude
+                                      position[1],      # Longitude
+                                      position[2],      # Altitude (meters)
+                                      position[3],      # Pitch
+                                      position[4],      # Roll
+                                      position[5],      # True Heading
+                                      airSpeed[0],      # Air Speed
+                                      verticalSpeed[0]))  # Vertical Air Speed
+
+
+class LatestValue(object):
+    """A single-slot handoff between a producer thread and a consumer thread.
+
+       The producer publishes as often as it likes and never waits for the consumer; the
+       consumer takes only the newest value and anything published in between is simply
+       replaced. A sampling loop can therefore run at its own rate while a display coalesces
+       to whatever was published last at its own, slower, frame rate.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.value = None
+        self.version = 0  # Number of values published
+        self.taken = 0  # Version of the value last taken
+        self.skipped = 0  # Values replaced before they were taken
+
+    def publish(self, value):
+        """Replaces the current value."""
+        with self.lock:
+            if self.version > self.taken:
+                self.skipped += 1
+            self.value = value
+            self.version += 1
+
+    def take(self):
+        """Returns the newest value, or None if nothing was published since the last take."""
+        with self.lock:
+            if self.version == self.taken:
+                return None
+            self.taken = self.version
+            return self.value
+
+    def clear(self):
+        """Drops the current value, if it has not been taken yet."""
+        with self.lock:
+            self.value = None
+            self.taken = self.version
+
+
+class Scheduler(object):
+    """Runs groups of work at fixed rates by sleeping until absolute deadlines.
+
+       Every group has its own interval. Deadlines advance by whole intervals from when the
+       schedule started rather than from when the work finished, so the time spent doing
+       the work does not accumulate as drift. A group that falls more than a whole interval
+       behind skips the deadlines it missed instead of running them back to back; the
+       skipped deadlines are counted in `missed` and passed to `onMissed`.
+    """
+    def __init__(self, intervals, onMissed=None, clock=time.monotonic):
+        """Creates a schedule. Nothing runs until `start` or `ticks` is called.
+
+            Args:
+              intervals: A dictionary mapping each group name to its interval in seconds.
+              onMissed: An optional function called as `onMissed(name, count, lateness)` when
+                a group misses `count` deadlines and runs `lateness` seconds late.
+              clock: The monotonic clock used for the deadlines.
+        """
+        for name, interval in intervals.items():
+            if interval <= 0:
+                raise ValueError("The interval of " + str(name) + " must be positive.")
+
+        self.intervals = dict(intervals)
+        self.onMissed = onMissed
+        self.clock = clock
+        self.deadlines = {}
+        self.missed = dict.fromkeys(self.intervals, 0)  # Deadlines skipped per group
+        self.lateness = dict.fromkeys(self.intervals, 0.0)  # Lateness of the last run per group, in seconds
+        self.maxLateness = dict.fromkeys(self.intervals, 0.0)  # Worst lateness per group, in seconds
+
+    def start(self):
+        """Makes every group due now."""
+        now = self.clock()
+        self.deadlines = dict.fromkeys(self.intervals, now)
+
+    def wait(self, stopEvent=None):
+        """Sleeps until the next deadline.
+
+            Args:
+              stopEvent: An optional `threading.Event` that cuts the wait short when set.
+
+            Returns: The names of the groups that are due, or None if `stopEvent` was set.
+        """
+        delay = min(self.deadlines.values()) - self.clock()
+        if stopEvent is not None:
+            if stopEvent.wait(max(delay, 0.0)):
+                return None
+        elif delay > 0:
+            time.sleep(delay)
+
+        now = self.clock()
+        due = []
+        for name, deadline in self.deadlines.items():
+            if deadline > now:
+                continue
+            due.append(name)
+
+            interval = self.intervals[name]
+            lateness = now - deadline
+            self.lateness[name] = lateness
+            self.maxLateness[name] = max(self.maxLateness[name], lateness)
+            skipped = int(lateness // interval)
+            if skipped:
+                self.missed[name] += skipped
+                if self.onMissed is not None:
+                    self.onMissed(name, skipped, lateness)
+            self.deadlines[name] = deadline + (skipped + 1) * interval
+        return due
+
+    def ticks(self, stopEvent=None):
+        """Starts the schedule and yields the names of the due groups at every deadline, until
+           `stopEvent` is set.
+        """
+        self.start()
+        while True:
+            due = self.wait(stopEvent)
+            if due is None:
+                return
+            if due:
+                yield due
+
+
+def reportMissed(group, count, lateness):
+    """An `onMissed` callback for a `Scheduler` that reports skipped deadlines on stderr."""
+    print(f"Sampling fell behind: skipped {count} {group} sample(s), {lateness * 1000:.0f} ms late",
+          file=sys.stderr, flush=True)
+
+
+class RollingHistogram(object):
+    """The distribution of the last `window` measurements of a duration, such as the round
+       trip time of a request.
+
+       Measurements are counted into fixed, logarithmically spaced bins. A ring remembers the
+       bin and value of every measurement in the window, so adding one (and forgetting the
+       oldest) is O(1) and no measurement is ever sorted. Percentiles are read from the
+       cumulative bin counts and are accurate to the width of a bin.
+    """
+    def __init__(self, window=1000, low=1e-4, high=10.0, bins=100):
+        """Creates an empty histogram.
+
+            Args:
+              window: The number of most recent measurements described.
+              low: The upper edge of the first bin, in seconds.
+              high: The lower edge of the last bin, in seconds.
+              bins: The number of bins between `low` and `high`.
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1.")
+
+        self.window = window
+        self.edges = numpy.geomspace(low, high, bins + 1).tolist()
+        self.counts = numpy.zeros(len(self.edges) + 1, dtype=numpy.int64)
+        self.values = numpy.zeros(window)
+        self.bins = numpy.zeros(window, dtype=numpy.intp)
+        self.total = 0.0  # Sum of the measurements in the window
+        self.count = 0  # Total measurements added since the last clear
+
+    def __len__(self):
+        return min(self.count, self.window)
+
+    def add(self, value):
+        """Adds one measurement, in seconds."""
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.counts[self.bins[slot]] -= 1
+            self.total -= self.values[slot]
+
+        bin = bisect_right(self.edges, value)
+        self.counts[bin] += 1
+        self.bins[slot] = bin
+        self.values[slot] = value
+        self.total += value
+        self.count += 1
+
+    def mean(self):
+        """The mean of the window, or 0.0 if it is empty."""
+        return float(self.total / len(self)) if self.count else 0.0
+
+    def max(self):
+        """The largest measurement in the window, or 0.0 if it is empty."""
+        return float(self.values[:len(self)].max()) if self.count else 0.0
+
+    def percentile(self, q):
+        """Estimates the `q`th percentile of the window as the upper edge of the bin holding it.
+
+            Returns: The estimate, never more than the largest measurement, or 0.0 if the window
+              is empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(q / 100.0 * len(self), 1)
+        bin = int(numpy.searchsorted(numpy.cumsum(self.counts), rank))
+        largest = self.max()
+        return min(self.edges[bin], largest) if bin < len(self.edges) else largest
+
+    def summary(self):
+        """Returns `(count, mean, p50, p90, p99, max)` for the window, durations in seconds."""
+        return (len(self), self.mean(), self.percentile(50), self.percentile(90),
+                self.percentile(99), self.max())
+
+    def clear(self):
+        """Forgets every measurement."""
+        self.counts[:] = 0
+        self.total = 0.0
+        self.count = 0
+
+
+class Sampler(object):
+    """Samples the CHANNELS of one simulator on a deadline schedule, without any display.
+
+       Position and attitude (GETP) and the air data datarefs (SNAPSHOT_DREFS) are fetched at
+       their own rates, in one round trip when both are due; air data is held between its
+       updates and a sample is taken on every position deadline. Each sample is stamped on a
+       monotonic clock, halfway through its round trip, in seconds since the sampler was
+       created. Round trip times and schedule lateness are kept in `timings`, one
+       `RollingHistogram` per source, and summarised to `writer` every `timingInterval`.
+
+       A sampler belongs to one session rather than one connection: after a reconnect, hand
+       it the new client with `connect` so the session time keeps increasing and the timings
+       cover the whole session.
+    """
+    def __init__(self, client, timeInterval=0.25, airDataInterval=0.25, writer=None,
+                 timingInterval=10.0, onMissed=None):
+        """Creates a sampler.
+
+            Args:
+              client: The `XPlaneConnect` to sample.
+              timeInterval: The interval between samples (position updates), in seconds.
+              airDataInterval: The interval between air data updates, in seconds.
+              writer: An optional `SessionWriter` that every sample and timing summary is
+                written to.
+              timingInterval: The interval between timing summaries, in seconds.
+              onMissed: An optional function called as `onMissed(group, count, lateness)`
+                when the schedule skips deadlines. See `Scheduler`.
+        """
+        self.connect(client)
+        self.writer = writer
+        self.timingInterval = timingInterval
+        self.scheduler = Scheduler({"position": timeInterval, "airData": airDataInterval}, onMissed)
+        self.timings = dict((source, RollingHistogram()) for source in
+                            ("GETP", "GETD", "Snapshot", "Position Jitter", "Air Data Jitter"))
+        self.sessionClock = time.monotonic()
+        self.sampleTime = 0.0  # Time of the latest sample
+        self.samples = 0
+
+    def connect(self, client):
+        """Samples `client` from now on, e.g. after reconnecting, keeping the session clock."""
+        self.client = client
+        self.query = client.prepare(SNAPSHOT_DREFS)
+
+    def missed(self, source):
+        """The number of deadlines skipped by the schedule a jitter source measures."""
+        if source == "Position Jitter":
+            return self.scheduler.missed["position"]
+        if source == "Air Data Jitter":
+            return self.scheduler.missed["airData"]
+        return 0
+
+    def run(self, stopEvent, onSample=None):
+        """Samples until `stopEvent` is set. Errors from the client are raised to the caller.
+
+            Args:
+              stopEvent: A `threading.Event` that stops sampling when set.
+              onSample: An optional function called as `onSample(sampleTime, row)` with every
+                sample, after it has been written.
+        """
+        scheduler, timings, client = self.scheduler, self.timings, self.client
+        airSpeed, verticalSpeed = [0.0], [0.0]  # Held between air data updates
+        lastTimingTime = time.monotonic()
+
+        for due in scheduler.ticks(stopEvent):
+
+            # Measure how late each schedule woke up
+            if "position" in due:
+                timings["Position Jitter"].add(scheduler.lateness["position"])
+            if "airData" in due:
+                timings["Air Data Jitter"].add(scheduler.lateness["airData"])
+
+            requestTime = time.monotonic()
+            if "position" not in due:
+                # Only refresh the held air data; samples are taken on the position schedule
+                airSpeed, verticalSpeed = client.getDREFs(self.query)
+                timings["GETD"].add(time.monotonic() - requestTime)
+                continue
+
+            if "airData" in due:
+                position, (airSpeed, verticalSpeed) = client.getSnapshot(self.query)
+                request = "Snapshot"
+            else:
+                position = client.getPOSI()
+                request = "GETP"
+
+            # Stamp the sample halfway through the round trip, the best estimate of when X-Plane read it
+            replyTime = time.monotonic()
+            timings[request].add(replyTime - requestTime)
+            self.sampleTime = (requestTime + replyTime) / 2 - self.sessionClock
+            self.samples += 1
+
+            row = sampleRow(position, airSpeed, verticalSpeed)
+            if self.writer is not None:
+                self.writer.writeRow(row, self.sampleTime)
+            if onSample is not None:
+                onSample(self.sampleTime, row)
+
+            # Summarise the timings now and then
+            if replyTime - lastTimingTime >= self.timingInterval:
+                self.writeTimings()
+                lastTimingTime = replyTime
+
+    def writeTimings(self):
+        """Writes a summary of every timing histogram that has measurements to `writer`."""
+        if self.writer is None:
+            return
+        for source, histogram in self.timings.items():
+            if len(histogram):
+                self.writer.writeTiming(source, histogram.summary(), self.missed(source), self.sampleTime)
+
+    def timingText(self):
+        """Formats the round trip times and jitter as a one-line status readout."""
+        text = []
+        for source in ("GETP", "GETD", "Snapshot"):
+            count, mean, p50, p90, p99, largest = self.timings[source].summary()
+            if count:
+                text.append(f"{source} {p50 * 1000:.1f}/{p99 * 1000:.1f} ms")
+        text.append(f"Jitter p99 {self.timings['Position Jitter'].percentile(99) * 1000:.1f} ms")
+        text.append(f"Missed {sum(self.scheduler.missed.values())}")
+        return "Round trip p50/p99: " + "   ".join(text)
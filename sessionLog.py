@@ -0,0 +1,570 @@
+import csv
+import mmap
+import os
+import queue
+import struct
+import time
+from bisect import bisect_right
+from threading import Thread
+
+import numpy
+
+# Session log layout (little-endian)
+#
+#   Header:  magic (8 bytes), uint16 payload width, uint16 channel count, then each channel
+#            name as a uint8 length followed by UTF-8 bytes.
+#   Records: fixed size, appended after the header:
+#              uint8   record type (RECORD_*)
+#              uint8   code: the event kind (EVENT_*) for event records, the quantity (see
+#                      STATS_QUANTITIES) for maneuver statistics records, otherwise 0
+#              uint16  arg: the maneuver number (see MANEUVERS) for maneuver events and
+#                      statistics, or the timing source (see TIMING_SOURCES) for timing records
+#              4 bytes padding
+#              float64 session time in seconds (the time axis of the panel)
+#              float64 wall clock time (time.time())
+#              float64 x width: the channel values of a sample, unused by events, the
+#                      TIMING_FIELDS of a timing record or the STATS_FIELDS of a maneuver
+#                      statistics record
+#
+# Because every record has the same size, record `i` lives at `dataStart + i * recordSize`.
+# A sidecar index file (`<path>.idx`) holds a sparse list of (wall time, record number)
+# pairs, so seeking to a time inside a long session only scans a handful of records.
+MAGIC = b"XPCLOG1\0"
+MIN_WIDTH = 8
+
+RECORD_SAMPLE = 1
+RECORD_EVENT = 2
+RECORD_TIMING = 3
+RECORD_MANEUVER_STATS = 4
+
+EVENT_SESSION_START = 1
+EVENT_SESSION_END = 2
+EVENT_DISCONNECTED = 3
+EVENT_MANEUVER_START = 4
+EVENT_MANEUVER_PASSED = 5
+EVENT_MANEUVER_FAILED = 6
+
+# Maneuvers are stored by their position in this list
+MANEUVERS = [
+    "Straight-and-Level Flight",
+    "Constant Airspeed Climbs",
+    "Constant Airspeed Descents",
+    "Turns to Headings",
+]
+
+# Maneuver start events carry the targets the maneuver was started with in their payload,
+# in this order, NaN for targets the maneuver does not use
+TARGET_FIELDS = ["altitude", "heading"]
+
+# Timing records summarise the latency of a request type, or the lateness of a sampling
+# schedule, over a rolling window. Sources are stored by their position in this list and
+# durations are in seconds.
+TIMING_SOURCES = [
+    "GETP",
+    "GETD",
+    "Snapshot",
+    "Position Jitter",
+    "Air Data Jitter",
+]
+TIMING_FIELDS = ["Count", "Mean", "P50", "P90", "P99", "Max", "Missed"]
+
+# When a maneuver ends, one statistics record per quantity summarises the deviation of the
+# quantity from its reference over the maneuver (see `maneuvers.DeviationStats`). Quantities
+# are stored by their position in this list; times are in seconds.
+STATS_QUANTITIES = ["Altitude", "Heading", "Airspeed"]
+STATS_FIELDS = ["Count", "Mean", "Std", "Min", "Max", "RMS", "Time Within", "Duration"]
+
+# The quantity the statistics of each channel are stored as. Other channels are not stored.
+STATS_CHANNELS = {
+    "Altitude": "Altitude",
+    "True Heading": "Heading",
+    "Air Speed": "Airspeed",
+}
+
+_HEADER = struct.Struct("<8sHH")
+_INDEX_ENTRY = struct.Struct("<dQ")
+
+
+def recordLayout(width):
+    """Returns the struct of one record with `width` payload values."""
+    return struct.Struct("<BBH4xdd{0:d}d".format(width))
+
+
+def recordDtype(width):
+    """Returns the NumPy dtype of one record with `width` payload values."""
+    return numpy.dtype([("type", "u1"), ("code", "u1"), ("arg", "<u2"), ("pad", "V4"),
+                        ("time", "<f8"), ("wallTime", "<f8"), ("values", "<f8", (width,))])
+
+
+def statsText(quantity, arg, values):
+    """Returns the debrief line of a maneuver statistics record in the text and CSV exports."""
+    count, mean, std, minimum, maximum, rms, timeWithin, duration = values[:len(STATS_FIELDS)]
+    within = 100.0 * timeWithin / duration if duration > 0 else 0.0
+    return (f"{STATS_QUANTITIES[quantity]} deviation: mean {mean:.1f}, std {std:.1f}, min {minimum:.1f}, "
+            f"max {maximum:.1f}, RMS {rms:.1f}, {within:.0f}% of {duration:.1f} s in tolerance "
+            f"({int(count)} samples)")
+
+
+def eventText(code, arg):
+    """Returns the marker line used for an event in the text and CSV exports."""
+    if code == EVENT_SESSION_START:
+        return "Start of Session"
+    if code == EVENT_SESSION_END:
+        return "End of Session"
+    if code == EVENT_DISCONNECTED:
+        return "Server Disconnected"
+
+    name = MANEUVERS[arg] if arg < len(MANEUVERS) else "Maneuver " + str(arg)
+    if code == EVENT_MANEUVER_START:
+        return name
+    if code == EVENT_MANEUVER_PASSED:
+        return name + " Ended (Passed)"
+    if code == EVENT_MANEUVER_FAILED:
+        return name + " Ended (Failed)"
+    return "Event " + str(code)
+
+
+class SessionWriter(object):
+    """Appends a session to a binary session log on a background thread.
+
+       Callers only put records on a bounded queue, so the sampling loop never waits on the
+       disk. The writer thread keeps the log open, packs each record into its fixed-size
+       layout and flushes when `batchSize` records are pending or `flushInterval` seconds have
+       passed, optionally followed by an fsync. If the queue fills up (the disk has stalled
+       for a long time) new records are dropped and counted in `droppedRecords` rather than
+       blocking the caller.
+
+       An error on the writer thread never stops it: a record that cannot be packed is
+       dropped, and after an I/O error (e.g. a full disk) the writer is `failed` and every
+       later record is dropped, all counted in `droppedRecords`. The first error is kept in
+       `error` and raised by `close`.
+    """
+    def __init__(self, path, channels, batchSize=64, flushInterval=1.0, fsync=False,
+                 queueSize=4096, indexInterval=256):
+        """Opens the log in append mode, writing a header if the file is new, and records the
+           start of a session.
+
+            Args:
+              path: The path of the session log.
+              channels: The names of the values in each sample.
+              batchSize: The number of pending records that triggers a flush.
+              flushInterval: The longest time (in seconds) a record waits before being flushed.
+              fsync: True to fsync the log after every flush.
+              queueSize: The number of records that may wait for the writer thread.
+              indexInterval: The number of samples between entries of the time index.
+        """
+        self.path = path
+        self.channels = list(channels)
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.fsync = fsync
+        self.indexInterval = indexInterval
+        self.droppedRecords = 0
+        self.error = None  # First error of the writer thread
+        self.failed = False  # True after an I/O error; records are then dropped
+        self.records = queue.Queue(maxsize=queueSize)
+
+        self.logFile = open(path, "a+b")
+        try:
+            self.width, self.dataStart = self._prepare()
+        except Exception:
+            self.logFile.close()
+            raise
+        self.layout = recordLayout(self.width)
+        self.padding = (0.0,) * (self.width - len(self.channels))
+        self.empty = (0.0,) * self.width
+        self.indexFile = open(path + ".idx", "ab")
+
+        # Record numbers continue from whatever earlier sessions left in the file
+        self.recordCount = (self.logFile.tell() - self.dataStart) // self.layout.size
+        self.sessionStart = self.recordCount
+        self.samplesSinceIndex = self.indexInterval
+
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.writeEvent(EVENT_SESSION_START)
+
+    def _prepare(self):
+        """Writes or checks the header and drops any partially written trailing record."""
+        self.logFile.seek(0, os.SEEK_END)
+        if self.logFile.tell() == 0:
+            width = max(len(self.channels), MIN_WIDTH)
+            header = _HEADER.pack(MAGIC, width, len(self.channels))
+            for name in self.channels:
+                encoded = name.encode()
+                header += struct.pack("<B", len(encoded)) + encoded
+            self.logFile.write(header)
+            self.logFile.flush()
+            return width, len(header)
+
+        reader = SessionLogReader(self.path)
+        try:
+            if reader.channels != self.channels:
+                raise ValueError(self.path + " was recorded with different channels.")
+            width, dataStart = reader.width, reader.dataStart
+            end = dataStart + len(reader) * reader.recordSize
+        finally:
+            reader.close()
+        self.logFile.truncate(end)
+        self.logFile.seek(end)
+        return width, dataStart
+
+    def writeRow(self, values, sampleTime, wallTime=None):
+        """Queues one sample.
+
+            Args:
+              values: The value of each channel, in the order of `channels`.
+              sampleTime: The session time of the sample in seconds.
+              wallTime: The time of the sample as returned by `time.time()`. Defaults to now.
+        """
+        self._put((RECORD_SAMPLE, 0, 0, sampleTime, time.time() if wallTime is None else wallTime,
+                   tuple(values) + self.padding))
+
+    def writeEvent(self, code, maneuver=None, sampleTime=0.0, values=None):
+        """Queues an event such as the start or end of a maneuver.
+
+            Args:
+              code: The kind of event (EVENT_*).
+              maneuver: The name of the maneuver for maneuver events (see MANEUVERS).
+              sampleTime: The session time of the event in seconds.
+              values: Optional payload values for the event.
+        """
+        arg = 0 if maneuver is None else MANEUVERS.index(maneuver)
+        payload = self.empty if values is None else tuple(values) + self.empty[len(values):]
+        self._put((RECORD_EVENT, code, arg, sampleTime, time.time(), payload))
+
+    def writeTiming(self, source, summary, missed=0, sampleTime=0.0):
+        """Queues a timing record.
+
+            Args:
+              source: The name of what was timed (see TIMING_SOURCES).
+              summary: The `(count, mean, p50, p90, p99, max)` of the measurements, in seconds.
+              missed: The number of deadlines the source has missed, if it is a schedule.
+              sampleTime: The session time of the record in seconds.
+        """
+        values = tuple(summary) + (missed,)
+        self._put((RECORD_TIMING, 0, TIMING_SOURCES.index(source), sampleTime, time.time(),
+                   values + self.empty[len(values):]))
+
+    def writeManeuverStats(self, maneuver, channel, summary, sampleTime=0.0):
+        """Queues the deviation statistics of one channel over a maneuver.
+
+            Args:
+              maneuver: The name of the maneuver (see MANEUVERS).
+              channel: The name of the channel (see STATS_CHANNELS).
+              summary: The STATS_FIELDS values, as returned by `DeviationStats.summary`.
+              sampleTime: The session time the maneuver ended, in seconds.
+
+            Returns: True if the record was queued, False if the log format has no place for the
+              maneuver or the channel, e.g. those of a custom `Limit`.
+        """
+        quantity = STATS_CHANNELS.get(channel)
+        if quantity is None or maneuver not in MANEUVERS:
+            return False
+        values = tuple(summary)
+        self._put((RECORD_MANEUVER_STATS, STATS_QUANTITIES.index(quantity), MANEUVERS.index(maneuver),
+                   sampleTime, time.time(), values + self.empty[len(values):]))
+        return True
+
+    def close(self, timeout=5.0):
+        """Writes everything still queued, then closes the log.
+
+            Args:
+              timeout: The longest time, in seconds, to wait for the writer thread.
+
+            Raises: The first error of the writer thread, or `TimeoutError` if it did not
+              finish within `timeout` (the log is then left to it).
+        """
+        if self.thread is None:
+            return
+        thread, self.thread = self.thread, None
+        deadline = time.monotonic() + timeout
+        try:
+            self.records.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(max(deadline - time.monotonic(), 0.0))
+        if thread.is_alive():
+            raise TimeoutError(f"The writer of {self.path} did not finish within {timeout} s.")
+
+        self.logFile.close()
+        self.indexFile.close()
+        if self.error is not None:
+            raise self.error
+
+    def _put(self, record):
+        if self.failed:
+            self.droppedRecords += 1
+            return
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.droppedRecords += 1
+
+    def _run(self):
+        pending = 0
+        lastFlush = time.monotonic()
+        while True:
+            timeout = max(self.flushInterval - (time.monotonic() - lastFlush), 0.0)
+            try:
+                record = self.records.get(timeout=timeout) if pending else self.records.get()
+            except queue.Empty:
+                record = ()
+
+            if record is None:
+                self._flush()
+                return
+            if record:
+                self._write(record)
+                pending += 1
+
+            if pending and (pending >= self.batchSize or
+                            time.monotonic() - lastFlush >= self.flushInterval):
+                self._flush()
+                pending = 0
+                lastFlush = time.monotonic()
+
+    def _write(self, record):
+        if self.failed:
+            self.droppedRecords += 1
+            return
+        kind, code, arg, sampleTime, wallTime, values = record
+        try:
+            packed = self.layout.pack(kind, code, arg, sampleTime, wallTime, *values)
+            self.logFile.write(packed)
+            if kind == RECORD_SAMPLE:
+                if self.samplesSinceIndex >= self.indexInterval:
+                    self.indexFile.write(_INDEX_ENTRY.pack(wallTime, self.recordCount))
+                    self.samplesSinceIndex = 0
+                self.samplesSinceIndex += 1
+        except Exception as e:
+            self.droppedRecords += 1
+            self._fail(e)
+            return
+        self.recordCount += 1
+
+    def _flush(self):
+        if self.failed:
+            return
+        try:
+            self.logFile.flush()
+            self.indexFile.flush()
+            if self.fsync:
+                os.fsync(self.logFile.fileno())
+                os.fsync(self.indexFile.fileno())
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        """Keeps the first error; an I/O error also stops any further writes."""
+        if self.error is None:
+            self.error = error
+        if isinstance(error, OSError):
+            self.failed = True
+
+
+class SessionLogReader(object):
+    """Reads a binary session log through a read-only memory map.
+
+       `records` is a structured NumPy view over every complete record in the file (see
+       `recordDtype`), so whole sessions can be sliced and masked without copying.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = b""
+        try:
+            size = os.fstat(self.file.fileno()).st_size
+            if size:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            if size < _HEADER.size:
+                raise ValueError(path + " is not a session log.")
+            magic, self.width, channelCount = _HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError(path + " is not a session log.")
+
+            offset = _HEADER.size
+            self.channels = []
+            for i in range(channelCount):
+                length = self.map[offset]
+                self.channels.append(bytes(self.map[offset + 1:offset + 1 + length]).decode())
+                offset += 1 + length
+
+            self.dataStart = offset
+            self.recordSize = recordLayout(self.width).size
+            count = (size - self.dataStart) // self.recordSize
+            self.records = numpy.frombuffer(self.map, dtype=recordDtype(self.width), count=count,
+                                            offset=self.dataStart)
+            self.index = self._loadIndex(count)
+        except IndexError:
+            self.close()
+            raise ValueError(path + " has a truncated header.")
+        except BaseException:
+            self.close()
+            raise
+
+    def _loadIndex(self, count):
+        """Loads the sparse time index, ignoring entries past the end of the log."""
+        times, numbers = [], []
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+        except OSError:
+            return times, numbers
+        for wallTime, number in _INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % _INDEX_ENTRY.size]):
+            if number < count and (not times or wallTime >= times[-1]):
+                times.append(wallTime)
+                numbers.append(number)
+        return times, numbers
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        """Releases the memory map."""
+        self.records = None
+        if isinstance(self.map, mmap.mmap):
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # Records handed out still view the map; it is released along with them
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def sessions(self):
+        """Returns the `(start, stop)` record ranges of each session in the log."""
+        starts = numpy.flatnonzero((self.records["type"] == RECORD_EVENT) &
+                                   (self.records["code"] == EVENT_SESSION_START))
+        if not len(starts) or starts[0] != 0:
+            starts = numpy.concatenate(([0], starts))
+        stops = list(starts[1:]) + [len(self.records)]
+        return [(int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+    def samples(self, start=0, stop=None):
+        """Returns the sample records between two record numbers.
+
+            Returns: A tuple `(times, wallTimes, values)` where `values` has one column per
+              channel.
+        """
+        records = self.records[start:stop]
+        records = records[records["type"] == RECORD_SAMPLE]
+        return records["time"], records["wallTime"], records["values"][:, :len(self.channels)]
+
+    def replay(self, start=0, stop=None, speed=1.0, stopEvent=None):
+        """Yields the records between two record numbers, paced by their session time.
+
+            Args:
+              start: The number of the first record.
+              stop: The number after the last record. None replays to the end of the log.
+              speed: How many times faster than real time to replay. None or 0 replays as fast
+                as possible.
+              stopEvent: An optional `threading.Event` that ends the replay when set.
+
+           Records come straight out of the memory map. The schedule is kept against absolute
+           deadlines from the first record, so time spent by the caller between records does
+           not accumulate as drift.
+        """
+        clock = time.monotonic()
+        origin = None
+        for record in self.records[start:stop]:
+            if stopEvent is not None and stopEvent.is_set():
+                return
+            if speed and record["type"] == RECORD_SAMPLE:
+                if origin is None:
+                    origin = float(record["time"])
+                delay = clock + (float(record["time"]) - origin) / speed - time.monotonic()
+                if delay > 0:
+                    if stopEvent is not None:
+                        if stopEvent.wait(delay):
+                            return
+                    else:
+                        time.sleep(delay)
+            yield record
+
+    def timings(self, start=0, stop=None):
+        """Returns the timing records between two record numbers.
+
+            Returns: A tuple `(times, sources, values)` where `sources` holds indices into
+              TIMING_SOURCES and `values` has one column per TIMING_FIELDS entry.
+        """
+        records = self.records[start:stop]
+        records = records[records["type"] == RECORD_TIMING]
+        return records["time"], records["arg"], records["values"][:, :len(TIMING_FIELDS)]
+
+    def maneuverStats(self, start=0, stop=None):
+        """Returns the maneuver statistics records between two record numbers.
+
+            Returns: A tuple `(times, maneuvers, quantities, values)` where `maneuvers` holds
+              indices into MANEUVERS, `quantities` indices into STATS_QUANTITIES and `values`
+              has one column per STATS_FIELDS entry.
+        """
+        records = self.records[start:stop]
+        records = records[records["type"] == RECORD_MANEUVER_STATS]
+        return records["time"], records["arg"], records["code"], records["values"][:, :len(STATS_FIELDS)]
+
+    def find(self, wallTime):
+        """Returns the number of the first record at or after `wallTime`.
+
+           The sparse index narrows the search to one interval, which is then scanned.
+        """
+        times, numbers = self.index
+        position = bisect_right(times, wallTime) - 1
+        start = numbers[position] if position >= 0 else 0
+        stop = numbers[position + 1] if position + 1 < len(numbers) else len(self.records)
+        wallTimes = self.records["wallTime"][start:stop]
+        return start + int(numpy.searchsorted(wallTimes, wallTime))
+
+
+def _exportRows(reader, start, stop):
+    """Yields `("row", timestamp, values)`, `("marker", text)` and `("stats", text)` for a
+       range of records.
+    """
+    for record in reader.records[start:stop]:
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record["wallTime"]))
+        if record["type"] == RECORD_SAMPLE:
+            yield "row", timestamp, record["values"][:len(reader.channels)].tolist()
+        elif record["type"] == RECORD_EVENT and record["code"] != EVENT_SESSION_START:
+            yield "marker", eventText(record["code"], record["arg"])
+        elif record["type"] == RECORD_MANEUVER_STATS:
+            yield "stats", statsText(record["code"], record["arg"], record["values"].tolist())
+
+
+def exportText(logPath, textPath, start=0, stop=None):
+    """Appends a range of records of a session log to a text log in the classic data.txt
+       format: a header, one comma separated row per sample and a marker line per event.
+    """
+    textExists = os.path.isfile(textPath)
+    with SessionLogReader(logPath) as reader, open(textPath, "a") as file:
+        if not textExists:
+            file.write("Timestamp," + ",".join(reader.channels) + "\n")
+        for entry in _exportRows(reader, start, stop):
+            if entry[0] == "row":
+                file.write(f"{entry[1]}," + ",".join(map(str, entry[2])) + "\n")
+            elif entry[0] == "stats":
+                file.write(f"    {entry[1]}\n")
+            else:
+                file.write(f"\n--- {entry[1]} ---\n\n")
+
+
+def exportCSV(logPath, csvPath, start=0, stop=None):
+    """Appends a range of records of a session log to a CSV log in the classic data.csv
+       format: a header, one row per sample and a single-cell marker row per event.
+    """
+    csvExists = os.path.isfile(csvPath)
+    with SessionLogReader(logPath) as reader, open(csvPath, "a", newline='') as file:
+        writer = csv.writer(file)
+        if not csvExists:
+            writer.writerow(['Timestamp'] + reader.channels)
+        for entry in _exportRows(reader, start, stop):
+            if entry[0] == "row":
+                writer.writerow([entry[1]] + entry[2])
+            elif entry[0] == "stats":
+                writer.writerow([entry[1]])
+            else:
+                writer.writerow([f"\n--- {entry[1]} ---\n\n"])
@@ -0,0 +1,212 @@
+"""Instructor panel for a room of simulators.
+
+Every station is sampled by one shared loop through an `XPlaneConnectPool`, so N simulators
+cost about one round trip per sample and no thread per station. Each station keeps a small
+`MetricsStore` of its recent samples. The window shows an overview grid with a text tile per
+station, which is cheap to refresh, and the full eight plots for the selected station only.
+Click a tile to select its station.
+
+    python stationPanel.py sim1=10.0.0.11 sim2=10.0.0.12:49009 --log-dir logs
+"""
+import argparse
+import math
+import os
+import time
+from threading import Thread, Event
+
+import xpc
+from derivedChannels import ChannelPipeline, attitudeRates
+from metricsStore import MetricsStore
+from sampling import LatestValue, Scheduler, CHANNELS, SNAPSHOT_DREFS, sampleRow
+from sessionLog import SessionWriter, EVENT_DISCONNECTED, EVENT_SESSION_END
+
+# Globals
+timeInterval = 0.25  # Seconds between samples of every station
+frameRate = 5  # Display refreshes per second
+dataLimit = 100  # Samples kept per station
+missedLimit = 4  # Consecutive unanswered samples before a station is shown as not responding
+stopEvent = Event()  # Event to stop the sampling thread
+pool = xpc.XPlaneConnectPool()  # One socket per station, served from one selector
+stations = {}  # Station name -> Station
+selectedStation = None  # Name of the station shown in detail
+latestOverview = LatestValue()  # Newest {name: (row, responding)} published by the sampling thread
+latestDetail = LatestValue()  # Newest (name, snapshot) of the selected station
+
+
+class Station(object):
+    """The recent samples and connection state of one simulator."""
+    def __init__(self, name, logPath=None):
+        self.name = name
+        self.derived = ChannelPipeline(CHANNELS, attitudeRates())  # Rates need the previous sample of this station
+        self.store = MetricsStore(self.derived.channels, dataLimit)
+        self.writer = None if logPath is None else SessionWriter(logPath, CHANNELS)
+        self.missed = 0  # Consecutive samples without a reply
+        self.responding = False
+
+
+# Adds a station given as name=host[:port]
+def addStation(spec, logDir=None):
+    name, _, address = spec.partition("=")
+    if not address:
+        name, address = spec, spec
+    host, _, port = address.partition(":")
+
+    pool.add(name, host or "localhost", int(port) if port else 49009)
+    logPath = None if logDir is None else os.path.join(logDir, name + ".xpclog")
+    stations[name] = Station(name, logPath)
+
+# Samples every station on each tick and publishes the overview and the selected station
+def monitor():
+    sessionClock = time.monotonic()
+    scheduler = Scheduler({"sample": timeInterval})
+
+    # Encode the air data request once; its bytes and reply layout are the same for every station
+    query = pool[next(iter(pool))].prepare(SNAPSHOT_DREFS)
+
+    for due in scheduler.ticks(stopEvent):
+        try:
+            requestTime = time.monotonic()
+            results = pool.getSnapshot(query)
+            sampleTime = (requestTime + time.monotonic()) / 2 - sessionClock
+
+            overview = {}
+            for name, result in results.items():
+                station = stations[name]
+                if result is None:
+                    station.missed += 1
+                    if station.missed == missedLimit and station.writer is not None:
+                        station.writer.writeEvent(EVENT_DISCONNECTED, sampleTime=station.store.latestTime())
+                else:
+                    position, (airSpeed, verticalSpeed) = result
+                    row = sampleRow(position, airSpeed, verticalSpeed)
+                    if station.writer is not None:
+                        station.writer.writeRow(row, sampleTime)
+                    station.store.append(sampleTime, station.derived.process(sampleTime, row))
+                    station.missed = 0
+                station.responding = station.missed < missedLimit
+                overview[name] = (station.store.latestRow(), station.responding)
+
+            latestOverview.publish(overview)
+            name = selectedStation
+            if name in stations:
+                latestDetail.publish((name, stations[name].store.snapshot()))
+
+        except Exception as e:
+            print(f"Error in data retrieval: {e}")
+
+# Formats the readout of a station tile
+def tileText(name, row, responding):
+    if not responding:
+        return f"{name}\nNot responding"
+    values = dict(zip(CHANNELS, row))
+    return (f"{name}\n"
+            f"ALT {values['Altitude']:7.0f} ft   HDG {values['True Heading'] % 360:03.0f}\n"
+            f"IAS {values['Air Speed']:5.0f} kt   VS {values['Vertical Air Speed']:+6.0f} fpm")
+
+# Shows a station in the detail view
+def selectStation(name):
+    global selectedStation
+
+    selectedStation = name
+    lbDetail.set(f"Station: {name}")
+    for tileName, tile in tiles.items():
+        tile.config(relief=SUNKEN if tileName == name else RAISED)
+
+    # Show what is already stored right away instead of waiting for the next sample
+    latestDetail.publish((name, stations[name].store.snapshot()))
+
+# Refreshes the tiles and the detail plots from the newest snapshots, then schedules the next frame
+def renderFrame():
+    overview = latestOverview.take()
+    if overview is not None:
+        for name, (row, responding) in overview.items():
+            text = tileText(name, row, responding)
+            if tileTexts.get(name) != text:  # Only touch tiles whose readout changed
+                tileTexts[name] = text
+                tiles[name].config(text=text, fg="black" if responding else "red")
+
+    detail = latestDetail.take()
+    if detail is not None and detail[0] == selectedStation:
+        renderer.update(detail[1])
+
+    if not stopEvent.is_set():
+        display.after(int(1000 / frameRate), renderFrame)
+
+# Handler for window close event
+def onClosing():
+    stopEvent.set()
+    monitorThread.join(timeout=1)
+
+    for station in stations.values():
+        if station.writer is not None:
+            station.writer.writeEvent(EVENT_SESSION_END, sampleTime=station.store.latestTime())
+            try:
+                station.writer.close()
+            except Exception as e:
+                print(f"Error writing the log of {station.name}: {e}")
+    pool.close()
+
+    display.quit()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+
+    # Command line options
+    parser = argparse.ArgumentParser(description="Instructor panel for many X-Plane stations.")
+    parser.add_argument("stations", nargs="+", metavar="NAME=HOST[:PORT]", help="stations to monitor")
+    parser.add_argument("--rate", type=float, default=1 / timeInterval, help="samples per second of every station")
+    parser.add_argument("--fps", type=float, default=frameRate, help="display refreshes per second")
+    parser.add_argument("--log-dir", default=None, help="write a session log per station to this directory")
+    args = parser.parse_args()
+    timeInterval, frameRate = 1 / args.rate, args.fps
+
+    for spec in args.stations:
+        addStation(spec, args.log_dir)
+
+    # GUI modules are only needed once a window is shown
+    from tkinter import Tk, Frame, Label, StringVar, BOTH, LEFT, RIGHT, Y, RAISED, SUNKEN
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from panelRenderer import PanelRenderer, PANEL_PLOTS
+
+    # Initialize Tkinter display
+    display = Tk()
+    display.title("Instructor Panel - Stations")
+    display.protocol("WM_DELETE_WINDOW", onClosing)
+
+    # Overview grid: one text tile per station
+    overviewFrame = Frame(display)
+    overviewFrame.pack(side=LEFT, fill=Y, padx=10, pady=10)
+    columns = max(1, int(math.ceil(math.sqrt(len(stations)) / 2)))
+    tiles, tileTexts = {}, {}
+    for i, name in enumerate(stations):
+        tile = Label(overviewFrame, text=name, font=("Courier", 11), justify=LEFT, relief=RAISED,
+                     borderwidth=2, padx=8, pady=4, anchor="w")
+        tile.grid(row=i // columns, column=i % columns, sticky="nsew", padx=3, pady=3)
+        tile.bind("<Button-1>", lambda event, name=name: selectStation(name))
+        tiles[name] = tile
+
+    # Detail view: the eight plots of the selected station
+    detailFrame = Frame(display)
+    detailFrame.pack(side=RIGHT, fill=BOTH, expand=True)
+    lbDetail = StringVar()
+    Label(detailFrame, textvariable=lbDetail, font=("Arial", 14)).pack(pady=5)
+
+    fig, axes = plt.subplots(2, 4, figsize=(16, 6))
+    canvas = FigureCanvasTkAgg(fig, master=detailFrame)
+
+    # Every station stores the same channels, so one renderer draws snapshots of any of them
+    renderer = PanelRenderer(fig, canvas, next(iter(stations.values())).store,
+                             [(ax,) + plot for ax, plot in zip(axes.flat, PANEL_PLOTS)])
+    fig.tight_layout(pad=3.0)
+    canvas.draw()
+    canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+
+    selectStation(next(iter(stations)))
+
+    # Start sampling, drawing frames and the Tkinter main loop
+    monitorThread = Thread(target=monitor, daemon=True)
+    monitorThread.start()
+    renderFrame()
+    display.mainloop()
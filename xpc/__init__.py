@@ -1,9 +1,50 @@
+import asyncio
+import selectors
 import socket
 import struct
+import threading
+import time
+from collections import deque
+
+# Precompiled layouts for decoding replies
+_POSI_FLOAT = struct.Struct(b"<4sxBfffffff")
+_POSI_DOUBLE = struct.Struct(b"<4sxBdddffff")
+_CTRL = struct.Struct(b"<4sxffffbfBf")
+_DATA_ROW = struct.Struct(b"<i8f")
+_BYTE = struct.Struct(b"B")
+_FLOAT_ROWS = {}
+
+# Precompiled layouts for encoding messages
+_HEADER = struct.Struct(b"<4sx")
+_DATA_ROW_OUT = struct.Struct(b"<I8f")
+_POSI_OUT = struct.Struct(b"<4sxBdddffff")
+_CTRL_OUT = struct.Struct(b"<4sxffffbfB")
+_CTRL_OUT_SPEEDBRAKE = struct.Struct(b"<4sxffffbfBf")
+_DREF_LAYOUTS = {}
+_DATA_ROW_DTYPE = None
+
+def _replyKey(buffer):
+    """Returns the key a reply is routed by: its header, plus the aircraft for POSI and CTRL."""
+    header = bytes(buffer[:4])
+    if header == b"POSI" and len(buffer) > 5:
+        return (header, buffer[5])
+    if header == b"CTRL" and len(buffer) > 26:
+        return (header, buffer[26])
+    return (header, None)
+
+def _floatRow(rowLen):
+    """Returns a cached struct for a little-endian row of `rowLen` floats."""
+    row = _FLOAT_ROWS.get(rowLen)
+    if row is None:
+        row = _FLOAT_ROWS[rowLen] = struct.Struct("<{0:d}f".format(rowLen).encode())
+    return row
 
 class XPlaneConnect(object):
     """XPlaneConnect (XPC) facilitates communication to and from the XPCPlugin."""
     socket = None
+    _streamThread = None
+    _streamError = None
+    discardedPackets = 0
 
     # Basic Functions
     def __init__(self, xpHost='localhost', xpPort=49009, port=0, timeout=100):
@@ -35,11 +76,25 @@ class XPlaneConnect(object):
 
         # Create and bind socket
         clientAddr = ("0.0.0.0", port)
+        timeout /= 1000.0
+        self._bind(clientAddr, timeout)
+
+        # Outgoing messages are packed into this builder's buffer
+        self._builder = MessageBuilder()
+
+    def _bind(self, clientAddr, timeout):
+        """Creates the underlying UDP socket and binds it to `clientAddr`."""
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self.socket.bind(clientAddr)
-        timeout /= 1000.0
         self.socket.settimeout(timeout)
 
+        # Received packets are written into this buffer and decoded in place
+        self._recvBuffer = bytearray(16384)
+        self._recvView = memoryview(self._recvBuffer)
+
+        # DATA packets that arrived while waiting for replies, kept for readDATA
+        self._dataPending = deque(maxlen=64)
+
     def __del__(self):
         self.close()
 
@@ -52,6 +107,10 @@ class XPlaneConnect(object):
 
     def close(self):
         """Closes the specified connection and releases resources associated with it."""
+        try:
+            self.stopStream()
+        except OSError:
+            pass  # The stream already failed; the socket is closed regardless
         if self.socket is not None:
             self.socket.close()
             self.socket = None
@@ -65,8 +124,104 @@ class XPlaneConnect(object):
         self.socket.sendto(buffer, 0, self.xpDst)
 
     def readUDP(self):
-        """Reads a message from the underlying UDP socket."""
-        return self.socket.recv(16384)
+        """Reads a message from the underlying UDP socket. Not available while streaming."""
+        self._checkNotStreaming("readUDP")
+        return bytes(self._recv())
+
+    def _recv(self):
+        """Reads a message into the receive buffer without allocating a new one.
+
+            Returns: A memoryview of the message. It is only valid until the next read.
+        """
+        size = self.socket.recv_into(self._recvBuffer)
+        return self._recvView[:size]
+
+    # Request/Response Demultiplexing
+    def _exchange(self, requests):
+        """Sends each `(buffer, key, parse)` request back-to-back and waits for every reply.
+
+           Replies are routed to requests by `_replyKey`. A reply that matches no outstanding
+           request, or that the request's parser rejects, is stale (for example the late reply
+           to a request that already timed out); it is dropped and counted in
+           `discardedPackets` instead of being returned to the wrong caller.
+
+            Returns: The parsed replies, in the order the requests were given.
+        """
+        if self._streamThread is not None:
+            return self._exchangeStreaming(_Exchange(requests))
+
+        exchange = self._beginExchange(requests)
+        timeout = self.socket.gettimeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while exchange.remaining:
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("timed out")
+                    self.socket.settimeout(remaining)
+                self._receive(exchange)
+        finally:
+            self.socket.settimeout(timeout)
+        return exchange.results
+
+    def _beginExchange(self, requests):
+        """Drops leftover packets, then sends `requests`. Returns the pending `_Exchange`."""
+        exchange = _Exchange(requests)
+
+        # Late replies that arrived since the last request are dropped before sending
+        self._drain()
+        for buffer, key, parse in requests:
+            self.sendUDP(buffer)
+        return exchange
+
+    def _receive(self, exchange):
+        """Reads one packet and offers it to `exchange`, discarding it if it is not wanted.
+           DATA packets are dispatched with `_dispatchDATA` instead.
+        """
+        buffer = self._recv()
+        if buffer[:4] == b"DATA":
+            self._dispatchDATA(buffer)
+        elif exchange is None or not exchange.offer(_replyKey(buffer), buffer):
+            self.discardedPackets += 1
+
+    def _exchangeStreaming(self, exchange):
+        # The background receiver owns the socket and routes replies to the exchange
+        exchange.finished = threading.Event()
+        with self._streamCondition:
+            if self._streamThread is None:
+                # The receiver stopped since the caller looked; the socket is ours again
+                return self._exchange(exchange.requests)
+            self._exchanges.append(exchange)
+        try:
+            for buffer, key, parse in exchange.requests:
+                self.sendUDP(buffer)
+            if not exchange.finished.wait(self.socket.gettimeout()):
+                raise socket.timeout("timed out")
+            if exchange.error is not None:
+                raise exchange.error
+        finally:
+            with self._streamCondition:
+                self._exchanges.remove(exchange)
+        return exchange.results
+
+    def _drain(self):
+        """Discards any replies already waiting in the socket. DATA packets among them are
+           dispatched with `_dispatchDATA` rather than dropped.
+        """
+        timeout = self.socket.gettimeout()
+        self.socket.setblocking(False)
+        try:
+            while True:
+                buffer = self._recv()
+                if buffer[:4] == b"DATA":
+                    self._dispatchDATA(buffer)
+                else:
+                    self.discardedPackets += 1
+        except OSError:
+            pass
+        finally:
+            self.socket.settimeout(timeout)
 
     # Configuration
     def setCONN(self, port):
@@ -109,6 +264,56 @@ class XPlaneConnect(object):
         self.sendUDP(buffer)
 
     # X-Plane UDP Data
+    def _dispatchDATA(self, buffer):
+        """Hands a DATA packet to its consumers: the stream (`stream` and `latestDATA`) while
+           one is running, otherwise the next `readDATA` call. Only the newest 64 packets
+           wait for `readDATA`.
+        """
+        if self._streamThread is None:
+            self._dataPending.append(bytes(buffer))
+            return
+
+        rows = self._parseDATA(buffer)
+        if rows is None:
+            return
+        with self._streamCondition:
+            self._streamPackets.append(rows)
+            self._streamCount += 1
+            for row in rows:
+                self._streamLatest[row[0]] = row
+            self._streamCondition.notify_all()
+
+    def _checkNotStreaming(self, name):
+        # The receiver thread owns the socket and the receive buffer while the stream runs
+        if self._streamThread is not None:
+            raise RuntimeError(name + ": use stream() or latestDATA() while streaming.")
+
+    def _recvDATA(self, name):
+        """Returns the oldest DATA packet dispatched while waiting for replies, or reads one.
+
+           Other packets read meanwhile (e.g. the late reply to a request that timed out) are
+           dropped and counted in `discardedPackets`. The socket timeout bounds the whole wait.
+        """
+        self._checkNotStreaming(name)
+        if self._dataPending:
+            return self._dataPending.popleft()
+
+        timeout = self.socket.gettimeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                buffer = self._recv()
+                if buffer[:4] == b"DATA":
+                    return buffer
+                self.discardedPackets += 1
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("timed out")
+                    self.socket.settimeout(remaining)
+        finally:
+            self.socket.settimeout(timeout)
+
     def readDATA(self):
         """Reads X-Plane data.
 
@@ -116,15 +321,163 @@ class XPlaneConnect(object):
               in the result will have 9 elements, the first of which is the row number which
               that array represents data for, and the rest of which are the data elements in
               that row.
+
+            Raises: RuntimeError while a stream is running; use `stream()` or `latestDATA()`.
         """
-        buffer = self.readUDP()
+        return self._parseDATA(self._recvDATA("readDATA"))
+
+    def _parseDATA(self, buffer):
+        """Parses a DATA message into the rows returned by `readDATA`."""
         if len(buffer) < 6:
             return None
         rows = (len(buffer) - 5) // 36
-        data = []
-        for i in range(rows):
-            data.append(struct.unpack_from(b"9f", buffer, 5 + 36*i))
-        return data
+        return list(_DATA_ROW.iter_unpack(memoryview(buffer)[5:5 + 36*rows]))
+
+    def readDATAArray(self):
+        """Reads X-Plane data into a NumPy array without unpacking rows one at a time.
+
+            Returns: A float64 array of shape (N, 9), or None if the packet holds no rows.
+              Column 0 is the row index and columns 1-8 are the values of that row.
+        """
+        rows = _dataRows(self._recvDATA("readDATAArray"))
+        if rows is None:
+            return None
+        return _rowsToArray(rows)
+
+    def readDATAInto(self, accumulator):
+        """Reads X-Plane data and appends its rows to a `DATAAccumulator`.
+
+            Returns: The number of rows appended.
+        """
+        return accumulator.extend(self._recvDATA("readDATAInto"))
+
+    # Streaming
+    def startStream(self, capacity=256):
+        """Starts draining DATA packets pushed by X-Plane on a background thread.
+
+           Packets are kept in a ring buffer of the most recent `capacity` packets and the
+           latest values of each data row are tracked, so consumers never poll X-Plane.
+           While the stream is running the background thread owns the socket.
+
+           If the socket fails (other than a connection reset, which only reports an earlier
+           send that was not delivered) the stream stops: calls waiting on replies raise the
+           error, `stream()` generators raise it, and so does the next `stopStream`.
+
+            Args:
+              capacity: The number of packets kept for consumers of `stream()`.
+        """
+        if self._streamThread is not None:
+            return
+
+        self._streamPackets = deque(maxlen=capacity)
+        self._streamError = None
+        self._streamCount = 0
+        self._exchanges = []
+        self._streamLatest = {}
+        self._streamCondition = threading.Condition()
+        self._streamStop = threading.Event()
+        self._streamThread = threading.Thread(target=self._streamLoop, daemon=True)
+        self._streamThread.start()
+
+    def stopStream(self):
+        """Stops the background receiver started by `startStream`.
+
+            Raises: The error that stopped the receiver, if it failed.
+        """
+        thread = self._streamThread
+        if thread is None:
+            error, self._streamError = self._streamError, None
+            if error is not None:
+                raise error
+            return
+
+        self._streamStop.set()
+        with self._streamCondition:
+            self._streamCondition.notify_all()
+        if thread is not threading.current_thread():
+            thread.join(timeout=1)
+        self._streamThread = None
+
+    def _streamLoop(self):
+        while not self._streamStop.is_set():
+            try:
+                buffer = self._recv()
+            except socket.timeout:
+                continue
+            except ConnectionResetError:
+                continue  # An ICMP port unreachable for an earlier send (Windows)
+            except (OSError, AttributeError) as e:
+                if not self._streamStop.is_set():
+                    self._failStream(e if isinstance(e, OSError) else OSError("The socket was closed."))
+                break
+
+            if buffer[:4] != b"DATA":
+                # Route replies to the request/response calls waiting on them
+                key = _replyKey(buffer)
+                with self._streamCondition:
+                    for exchange in self._exchanges:
+                        if exchange.offer(key, buffer):
+                            break
+                    else:
+                        self.discardedPackets += 1
+                continue
+            self._dispatchDATA(buffer)
+
+    def _failStream(self, error):
+        """Stops the stream after a socket error and fails every call waiting on a reply."""
+        with self._streamCondition:
+            self._streamError = error
+            self._streamThread = None
+            self._streamStop.set()
+            for exchange in self._exchanges:
+                exchange.fail(error)
+            self._streamCondition.notify_all()
+
+    def stream(self):
+        """Yields the rows of each DATA packet received by the background receiver.
+
+           Each call returns an independent generator that sees every packet received after
+           it starts. A consumer that falls more than `capacity` packets behind skips the
+           oldest ones. The generator ends when the stream is stopped.
+
+            Returns: A generator of the values `readDATA` would have returned.
+        """
+        if self._streamThread is None:
+            raise RuntimeError("stream: startStream() has not been called.")
+
+        condition = self._streamCondition
+        stop = self._streamStop
+        with condition:
+            seen = self._streamCount
+        while not stop.is_set():
+            with condition:
+                while self._streamCount == seen and not stop.is_set():
+                    condition.wait()
+                packets = self._streamPackets
+                missed = min(self._streamCount - seen, len(packets))
+                pending = [packets[i] for i in range(len(packets) - missed, len(packets))]
+                seen = self._streamCount
+            for rows in pending:
+                yield rows
+        if self._streamError is not None:
+            raise self._streamError
+
+    def latestDATA(self, row=None):
+        """Gets the most recent values received by the background receiver.
+
+            Args:
+              row: The data row to get. If omitted, all rows received so far are returned.
+
+            Returns: The latest 9 element row for `row` (or None if it has not been received),
+              or a dictionary mapping each received row index to its latest row.
+        """
+        if self._streamThread is None:
+            raise RuntimeError("latestDATA: startStream() has not been called.")
+
+        with self._streamCondition:
+            if row is None:
+                return dict(self._streamLatest)
+            return self._streamLatest.get(row)
 
     def sendDATA(self, data):
         """Sends X-Plane data over the underlying UDP socket.
@@ -132,16 +485,16 @@ class XPlaneConnect(object):
             Args:
               data: An array of values representing data rows to be set. Each array in `data`
                 should have 9 elements, the first of which is a row number in the range (0-134),
-                and the rest of which are the values to set for that data row.
+                and the rest of which are the values to set for that data row. A NumPy array
+                of shape (N, 9) is encoded in bulk.
         """
         if len(data) > 134:
             raise ValueError("Too many rows in data.")
 
-        buffer = struct.pack(b"<4sx", b"DATA")
-        for row in data:
-            if len(row) != 9:
-                raise ValueError("Row does not contain exactly 9 values. <" + str(row) + ">")
-            buffer += struct.pack(b"<I8f", *row)
+        if hasattr(data, "shape"):
+            buffer = self._builder.packDATAArray(data)
+        else:
+            buffer = self._builder.packDATA(data)
         self.sendUDP(buffer)
 
     # Position
@@ -151,21 +504,21 @@ class XPlaneConnect(object):
         Args:
           ac: The aircraft to get the position of. 0 is the main/player aircraft.
         """
-        # Send request
+        # Send request and read response
         buffer = struct.pack(b"<4sxB", b"GETP", ac)
-        self.sendUDP(buffer)
+        return self._exchange([(buffer, (b"POSI", ac), self._parsePOSI)])[0]
 
-        # Read response
-        resultBuf = self.readUDP()
+    def _parsePOSI(self, resultBuf):
+        """Parses a POSI response into the values returned by `getPOSI`."""
         if len(resultBuf) == 34:
-            result = struct.unpack(b"<4sxBfffffff", resultBuf)
+            result = _POSI_FLOAT.unpack(resultBuf)
         elif len(resultBuf) == 46:
-            result = struct.unpack(b"<4sxBdddffff", resultBuf)
+            result = _POSI_DOUBLE.unpack(resultBuf)
         else:
             raise ValueError("Unexpected response length.")
 
         if result[0] != b"POSI":
-            raise ValueError("Unexpected header: " + result[0])
+            raise ValueError("Unexpected header: " + str(result[0]))
 
         # Drop the header & ac from the return value
         return result[2:]
@@ -194,15 +547,7 @@ class XPlaneConnect(object):
             raise ValueError("Aircraft number must be between 0 and 20.")
 
         # Pack message
-        buffer = struct.pack(b"<4sxB", b"POSI", ac)
-        for i in range(7):
-            val = -998
-            if i < len(values):
-                val = values[i]
-            if i < 3:
-                buffer += struct.pack(b"<d", val)
-            else:
-                buffer += struct.pack(b"<f", val)
+        buffer = self._builder.packPOSI(values, ac)
 
         # Send
         self.sendUDP(buffer)
@@ -214,18 +559,18 @@ class XPlaneConnect(object):
         Args:
           ac: The aircraft to get the control surfaces of. 0 is the main/player aircraft.
         """
-        # Send request
+        # Send request and read response
         buffer = struct.pack(b"<4sxB", b"GETC", ac)
-        self.sendUDP(buffer)
+        return self._exchange([(buffer, (b"CTRL", ac), self._parseCTRL)])[0]
 
-        # Read response
-        resultBuf = self.readUDP()
+    def _parseCTRL(self, resultBuf):
+        """Parses a CTRL response into the values returned by `getCTRL`."""
         if len(resultBuf) != 31:
             raise ValueError("Unexpected response length.")
 
-        result = struct.unpack(b"<4sxffffbfBf", resultBuf)
+        result = _CTRL.unpack(resultBuf)
         if result[0] != b"CTRL":
-            raise ValueError("Unexpected header: " + result[0])
+            raise ValueError("Unexpected header: " + str(result[0]))
 
         # Drop the header from the return value
         result =result[1:7] + result[8:]
@@ -255,20 +600,7 @@ class XPlaneConnect(object):
             raise ValueError("Aircraft number must be between 0 and 20.")
 
         # Pack message
-        buffer = struct.pack(b"<4sx", b"CTRL")
-        for i in range(6):
-            val = -998
-            if i < len(values):
-                val = values[i]
-            if i == 4:
-                val = -1 if (abs(val + 998) < 1e-4) else val
-                buffer += struct.pack(b"b", int(val))
-            else:
-                buffer += struct.pack(b"<f", val)
-
-        buffer += struct.pack(b"B", ac)
-        if len(values) == 7:
-            buffer += struct.pack(b"<f", values[6])
+        buffer = self._builder.packCTRL(values, ac)
 
         # Send
         self.sendUDP(buffer)
@@ -293,27 +625,8 @@ class XPlaneConnect(object):
         if len(drefs) != len(values):
             raise ValueError("drefs and values must have the same number of elements.")
 
-        buffer = struct.pack(b"<4sx", b"DREF")
-        for i in range(len(drefs)):
-            dref = drefs[i]
-            value = values[i]
-
-            # Preconditions
-            if len(dref) == 0 or len(dref) > 255:
-                raise ValueError("dref must be a non-empty string less than 256 characters.")
-
-            if value is None:
-                raise ValueError("value must be a scalar or sequence of floats.")
-
-            # Pack message
-            if hasattr(value, "__len__"):
-                if len(value) > 255:
-                    raise ValueError("value must have less than 256 items.")
-                fmt = "<B{0:d}sB{1:d}f".format(len(dref), len(value))
-                buffer += struct.pack(fmt.encode(), len(dref), dref.encode(), len(value), value)
-            else:
-                fmt = "<B{0:d}sBf".format(len(dref))
-                buffer += struct.pack(fmt.encode(), len(dref), dref.encode(), 1, value)
+        # Pack message
+        buffer = self._builder.packDREFs(drefs, values)
 
         # Send
         self.sendUDP(buffer)
@@ -332,32 +645,112 @@ class XPlaneConnect(object):
         """Gets the value of one or more X-Plane datarefs.
 
             Args:
-              drefs: The names of the datarefs to get.
+              drefs: The names of the datarefs to get, or a query returned by `prepare`.
 
             Returns: A multidimensional sequence of data representing the values of the requested
              datarefs.
         """
-        # Send request
+        # Send request and read response
+        request, parse = self._resolveGETD(drefs)
+        return self._exchange([(request, (b"RESP", None), parse)])[0]
+
+    def prepare(self, drefs):
+        """Prepares a reusable query for a fixed set of datarefs.
+
+            Args:
+              drefs: The names of the datarefs to query.
+
+            Returns: A `PreparedDREFs` object. Its `get()` and `send(values)` methods are
+              equivalent to `getDREFs(drefs)` and `sendDREFs(drefs, values)`, and it may be
+              passed anywhere a list of dataref names is accepted by a get method.
+        """
+        return PreparedDREFs(self, drefs)
+
+    def _resolveGETD(self, drefs):
+        """Returns the GETD request and the reply parser for `drefs`."""
+        if isinstance(drefs, PreparedDREFs):
+            return drefs.request, drefs.parse
+        return self._packGETD(drefs), lambda buffer: self._parseRESP(buffer, len(drefs))
+
+    def _packGETD(self, drefs):
+        """Packs a GETD request for the specified datarefs."""
         buffer = struct.pack(b"<4sxB", b"GETD", len(drefs))
         for dref in drefs:
             fmt = "<B{0:d}s".format(len(dref))
             buffer += struct.pack(fmt.encode(), len(dref), dref.encode())
-        self.sendUDP(buffer)
+        return buffer
 
-        # Read and parse response
-        buffer = self.readUDP()
-        resultCount = struct.unpack_from(b"B", buffer, 5)[0]
+    def _parseRESP(self, buffer, count=None):
+        """Parses a RESP message into the values returned by `getDREFs`.
+
+            Args:
+              buffer: The RESP message.
+              count: The number of results expected, if known. A reply with a different
+                count is rejected.
+        """
+        resultCount = _BYTE.unpack_from(buffer, 5)[0]
+        if count is not None and resultCount != count:
+            raise ValueError("Unexpected result count.")
         offset = 6
         result = []
         for i in range(resultCount):
-            rowLen = struct.unpack_from(b"B", buffer, offset)[0]
+            rowLen = _BYTE.unpack_from(buffer, offset)[0]
             offset += 1
-            fmt = "<{0:d}f".format(rowLen)
-            row = struct.unpack_from(fmt.encode(), buffer, offset)
+            row = _floatRow(rowLen).unpack_from(buffer, offset)
             result.append(row)
             offset += rowLen * 4
         return result
 
+    # Combined Requests
+    def getSnapshot(self, drefs, ac=0):
+        """Gets position information and the values of one or more datarefs in a single
+           round trip. The GETP and GETD requests are sent back-to-back and the replies are
+           matched by header, so the order in which X-Plane answers does not matter.
+
+            Args:
+              drefs: The names of the datarefs to get, or a query returned by `prepare`.
+              ac: The aircraft to get the position of. 0 is the main/player aircraft.
+
+            Returns: A tuple `(posi, values)` where `posi` is the result of `getPOSI(ac)` and
+              `values` is the result of `getDREFs(drefs)`.
+        """
+        # Send both requests before waiting on either reply
+        request, parse = self._resolveGETD(drefs)
+        posi, values = self._exchange([
+            (struct.pack(b"<4sxB", b"GETP", ac), (b"POSI", ac), self._parsePOSI),
+            (request, (b"RESP", None), parse)])
+        return posi, values
+
+    # Multi-Aircraft Requests
+    def getPOSIs(self, acs):
+        """Gets position information for several aircraft in a single round trip. All GETP
+           requests are sent back-to-back and the replies are gathered by aircraft number.
+
+            Args:
+              acs: The aircraft to get the position of, e.g. `range(21)`.
+
+            Returns: A float64 NumPy array of shape (len(acs), 7). Row `i` holds the values
+              `getPOSI(acs[i])` would return.
+        """
+        acs = _checkAircraft(acs)
+        rows = self._exchange([(struct.pack(b"<4sxB", b"GETP", ac), (b"POSI", ac), self._parsePOSI)
+                               for ac in acs])
+        return _rowsToMatrix(rows, 7)
+
+    def getCTRLs(self, acs):
+        """Gets control surface information for several aircraft in a single round trip.
+
+            Args:
+              acs: The aircraft to get the control surfaces of, e.g. `range(21)`.
+
+            Returns: A float64 NumPy array of shape (len(acs), 7). Row `i` holds the values
+              `getCTRL(acs[i])` would return.
+        """
+        acs = _checkAircraft(acs)
+        rows = self._exchange([(struct.pack(b"<4sxB", b"GETC", ac), (b"CTRL", ac), self._parseCTRL)
+                               for ac in acs])
+        return _rowsToMatrix(rows, 7)
+
     # Drawing
     def sendTEXT(self, msg, x=-1, y=-1):
         """Sets a message that X-Plane will display on the screen.
@@ -426,6 +819,795 @@ class XPlaneConnect(object):
         self.sendUDP(buffer)
 
 
+class MessageBuilder(object):
+    """Packs outgoing XPC messages into a single reusable buffer.
+
+       Each `pack*` method writes a complete message with `pack_into` using precompiled
+       layouts and returns a memoryview of it. The view is only valid until the next call
+       on the same builder, so it should be sent before another message is packed.
+    """
+    def __init__(self, size=65507):
+        self._reserve(size)
+
+    def _reserve(self, size):
+        if getattr(self, "buffer", None) is None or len(self.buffer) < size:
+            self.buffer = bytearray(size)
+            self.view = memoryview(self.buffer)
+
+    def packDATA(self, data):
+        """Packs a DATA message from a sequence of 9 element rows."""
+        self._reserve(5 + 36 * len(data))
+        _HEADER.pack_into(self.buffer, 0, b"DATA")
+        offset = 5
+        for row in data:
+            if len(row) != 9:
+                raise ValueError("Row does not contain exactly 9 values. <" + str(row) + ">")
+            _DATA_ROW_OUT.pack_into(self.buffer, offset, *row)
+            offset += 36
+        return self.view[:offset]
+
+    def packDATAArray(self, rows):
+        """Packs a DATA message from a NumPy array of shape (N, 9) in one vectorized copy."""
+        import numpy
+
+        rows = numpy.asarray(rows)
+        if rows.ndim != 2 or rows.shape[1] != 9:
+            raise ValueError("Rows must be an array of shape (N, 9).")
+
+        size = 5 + 36 * len(rows)
+        self._reserve(size)
+        _HEADER.pack_into(self.buffer, 0, b"DATA")
+        out = numpy.frombuffer(self.buffer, dtype=_dataRowDtype(), count=len(rows), offset=5)
+        out["index"] = rows[:, 0]
+        out["values"] = rows[:, 1:]
+        del out
+        return self.view[:size]
+
+    def packPOSI(self, values, ac=0):
+        """Packs a POSI message. Missing values are sent as `-998` (unchanged)."""
+        if len(values) < 7:
+            values = list(values) + [-998] * (7 - len(values))
+        _POSI_OUT.pack_into(self.buffer, 0, b"POSI", ac, *values)
+        return self.view[:_POSI_OUT.size]
+
+    def packCTRL(self, values, ac=0):
+        """Packs a CTRL message. Missing values are sent as `-998` (unchanged)."""
+        surfaces = list(values[:6])
+        if len(surfaces) < 6:
+            surfaces += [-998] * (6 - len(surfaces))
+        gear = surfaces[4]
+        surfaces[4] = int(-1 if (abs(gear + 998) < 1e-4) else gear)
+
+        if len(values) == 7:
+            layout = _CTRL_OUT_SPEEDBRAKE
+            layout.pack_into(self.buffer, 0, b"CTRL", *surfaces, ac, values[6])
+        else:
+            layout = _CTRL_OUT
+            layout.pack_into(self.buffer, 0, b"CTRL", *surfaces, ac)
+        return self.view[:layout.size]
+
+    def packDREFs(self, drefs, values):
+        """Packs a DREF message setting each dataref in `drefs` to the matching value."""
+        rows = []
+        size = 5
+        for dref, value in zip(drefs, values):
+            # Preconditions
+            if len(dref) == 0 or len(dref) > 255:
+                raise ValueError("dref must be a non-empty string less than 256 characters.")
+
+            if value is None:
+                raise ValueError("value must be a scalar or sequence of floats.")
+
+            if hasattr(value, "__len__"):
+                if len(value) > 255:
+                    raise ValueError("value must have less than 256 items.")
+                count = len(value)
+            else:
+                count = 1
+                value = (value,)
+
+            layout = _drefLayout(len(dref), count)
+            rows.append((layout, dref, value))
+            size += layout.size
+
+        self._reserve(size)
+        _HEADER.pack_into(self.buffer, 0, b"DREF")
+        offset = 5
+        for layout, dref, value in rows:
+            layout.pack_into(self.buffer, offset, len(dref), dref.encode(), len(value), *value)
+            offset += layout.size
+        return self.view[:offset]
+
+
+def _dataRowDtype():
+    """Returns the NumPy dtype of one DATA row: an int32 row index and 8 float32 values."""
+    global _DATA_ROW_DTYPE
+    if _DATA_ROW_DTYPE is None:
+        import numpy
+        _DATA_ROW_DTYPE = numpy.dtype([("index", "<i4"), ("values", "<f4", (8,))])
+    return _DATA_ROW_DTYPE
+
+
+def _dataRows(buffer):
+    """Returns a structured NumPy view over the rows of a DATA message without copying."""
+    import numpy
+
+    rows = (len(buffer) - 5) // 36
+    if rows <= 0:
+        return None
+    return numpy.frombuffer(buffer, dtype=_dataRowDtype(), count=rows, offset=5)
+
+
+def _rowsToArray(rows, out=None):
+    """Copies structured DATA rows into an (N, 9) array, allocating one if `out` is None."""
+    import numpy
+
+    if out is None:
+        out = numpy.empty((len(rows), 9))
+    out[:, 0] = rows["index"]
+    out[:, 1:] = rows["values"]
+    return out
+
+
+def _checkAircraft(acs):
+    """Validates a sequence of aircraft numbers and returns it as a list."""
+    acs = list(acs)
+    for ac in acs:
+        if ac < 0 or ac > 20:
+            raise ValueError("Aircraft number must be between 0 and 20.")
+    return acs
+
+
+def _rowsToMatrix(rows, width):
+    """Packs equal length result rows into a float64 NumPy array."""
+    import numpy
+
+    out = numpy.empty((len(rows), width))
+    for i, row in enumerate(rows):
+        out[i] = row
+    return out
+
+
+def _drefLayout(nameLen, count):
+    """Returns a cached struct for one dataref entry of a DREF message."""
+    key = (nameLen, count)
+    layout = _DREF_LAYOUTS.get(key)
+    if layout is None:
+        layout = _DREF_LAYOUTS[key] = struct.Struct("<B{0:d}sB{1:d}f".format(nameLen, count).encode())
+    return layout
+
+
+class DATAAccumulator(object):
+    """Collects DATA rows from successive packets into one preallocated NumPy array.
+
+       Rows are copied straight from each packet into the next free slots of `rows`, so
+       downstream analysis can work on `data` without concatenating per-packet results.
+       The array doubles in size if it fills up.
+    """
+    def __init__(self, capacity=4096):
+        import numpy
+
+        self.rows = numpy.empty((capacity, 9))
+        self.count = 0
+
+    @property
+    def data(self):
+        """The rows collected so far as an (N, 9) view."""
+        return self.rows[:self.count]
+
+    def clear(self):
+        """Discards the collected rows without releasing the array."""
+        self.count = 0
+
+    def extend(self, buffer):
+        """Appends the rows of a DATA message. Returns the number of rows appended."""
+        rows = _dataRows(buffer)
+        if rows is None:
+            return 0
+
+        end = self.count + len(rows)
+        if end > len(self.rows):
+            import numpy
+
+            grown = numpy.empty((max(end, 2 * len(self.rows)), 9))
+            grown[:self.count] = self.rows[:self.count]
+            self.rows = grown
+        _rowsToArray(rows, self.rows[self.count:end])
+        self.count = end
+        return len(rows)
+
+
+class PreparedDREFs(object):
+    """A dataref query prepared by `XPlaneConnect.prepare`.
+
+       The GETD request is encoded once up front. The reply decoder is a `struct.Struct`
+       compiled from the first reply and reused as long as replies keep the same layout.
+       DREF messages are packed from a cached `struct.Struct` and argument template for
+       each distinct shape of `values`.
+    """
+    def __init__(self, client, drefs):
+        # Preconditions
+        if len(drefs) == 0 or len(drefs) > 255:
+            raise ValueError("drefs must contain between 1 and 255 names.")
+        for dref in drefs:
+            if len(dref) == 0 or len(dref) > 255:
+                raise ValueError("dref must be a non-empty string less than 256 characters.")
+
+        self.client = client
+        self.drefs = list(drefs)
+        self.request = client._packGETD(self.drefs)
+        self._names = [dref.encode() for dref in self.drefs]
+        self._decoder = None
+        self._slices = None
+        self._packers = {}
+
+    def get(self):
+        """Gets the values of the prepared datarefs. See `XPlaneConnect.getDREFs`."""
+        return self.client.getDREFs(self)
+
+    def send(self, values):
+        """Sets the prepared datarefs to the specified values. See `XPlaneConnect.sendDREFs`."""
+        self.client.sendUDP(self.pack(values))
+
+    def parse(self, buffer):
+        """Parses a RESP message into the values returned by `getDREFs`."""
+        if self._decoder is None or self._decoder.size != len(buffer):
+            self._compileDecoder(buffer)
+            if len(self._slices) != len(self.drefs):
+                self._decoder = None
+                raise ValueError("Unexpected result count.")
+        result = self._decoder.unpack(buffer)
+        if result[0] != b"RESP":
+            raise ValueError("Unexpected header: " + str(result[0]))
+        return [result[start:end] for start, end in self._slices]
+
+    def _compileDecoder(self, buffer):
+        # Walk the row lengths once and build a single format covering the whole reply
+        resultCount = struct.unpack_from(b"B", buffer, 5)[0]
+        fmt = "<4sxB"
+        offset = 6
+        index = 2
+        slices = []
+        for i in range(resultCount):
+            rowLen = struct.unpack_from(b"B", buffer, offset)[0]
+            fmt += "B{0:d}f".format(rowLen)
+            slices.append((index + 1, index + 1 + rowLen))
+            offset += 1 + rowLen * 4
+            index += 1 + rowLen
+        self._decoder = struct.Struct(fmt.encode())
+        self._slices = slices
+
+    def pack(self, values):
+        """Packs a DREF message setting the prepared datarefs to `values`."""
+        if len(values) != len(self.drefs):
+            raise ValueError("drefs and values must have the same number of elements.")
+
+        shape = []
+        for value in values:
+            if value is None:
+                raise ValueError("value must be a scalar or sequence of floats.")
+            shape.append(len(value) if hasattr(value, "__len__") else -1)
+        shape = tuple(shape)
+
+        packer = self._packers.get(shape)
+        if packer is None:
+            packer = self._packers[shape] = self._compilePacker(shape)
+        fmt, template, positions = packer
+
+        args = list(template)
+        for value, count, position in zip(values, shape, positions):
+            if count < 0:
+                args[position] = value
+            else:
+                args[position:position + count] = value
+        return fmt.pack(*args)
+
+    def _compilePacker(self, shape):
+        fmt = "<4sx"
+        template = [b"DREF"]
+        positions = []
+        for name, count in zip(self._names, shape):
+            if count > 255:
+                raise ValueError("value must have less than 256 items.")
+            size = 1 if count < 0 else count
+            fmt += "B{0:d}sB{1:d}f".format(len(name), size)
+            template += [len(name), name, size]
+            positions.append(len(template))
+            template += [0.0] * size
+        return struct.Struct(fmt.encode()), template, positions
+
+
+class _Exchange(object):
+    """The replies still owed to one call of `XPlaneConnect._exchange`."""
+    finished = None
+    error = None
+
+    def __init__(self, requests):
+        self.requests = requests
+        self.results = [None] * len(requests)
+        self.remaining = len(requests)
+        self.pending = {}
+        for index, (buffer, key, parse) in enumerate(requests):
+            self.pending.setdefault(key, deque()).append(index)
+
+    def offer(self, key, buffer):
+        """Hands a reply to the oldest request that accepts it. Returns False if none does."""
+        waiting = self.pending.get(key)
+        if not waiting:
+            return False
+        for position, index in enumerate(waiting):
+            try:
+                result = self.requests[index][2](buffer)
+            except (ValueError, struct.error):
+                continue
+            del waiting[position]
+            self.results[index] = result
+            self.remaining -= 1
+            if self.remaining == 0 and self.finished is not None:
+                self.finished.set()
+            return True
+        return False
+
+    def fail(self, error):
+        """Ends the wait for the replies with `error`, e.g. when the receiver stopped."""
+        self.error = error
+        if self.finished is not None:
+            self.finished.set()
+
+
+class _XPCProtocol(asyncio.DatagramProtocol):
+    """Routes datagrams from the XPC plugin to the coroutines waiting on them.
+
+       Replies carry no request id, so waiters are keyed by `_replyKey`: the header and, for
+       POSI and CTRL, the aircraft number. Each waiter is a `(future, parse)` pair; a reply
+       goes to the oldest waiter whose parser accepts it, and replies no waiter accepts are
+       stale and dropped. DATA packets are queued for `readDATA`.
+    """
+    def __init__(self, dataLimit=64):
+        self.transport = None
+        self.waiters = {}
+        self.data = deque(maxlen=dataLimit)
+        self.dataWaiters = deque()
+        self.discardedPackets = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        key = _replyKey(data)
+        if key[0] == b"DATA":
+            self._deliverDATA(data)
+        elif not self._deliver(self.waiters.get(key), data):
+            self.discardedPackets += 1
+
+    def _deliver(self, waiters, data):
+        # Hand the reply to the oldest waiter that is still interested in it and accepts it
+        if not waiters:
+            return False
+        for waiter in list(waiters):
+            future, parse = waiter
+            if future.done():
+                waiters.remove(waiter)
+                continue
+            try:
+                result = parse(data)
+            except (ValueError, struct.error):
+                continue
+            waiters.remove(waiter)
+            future.set_result(result)
+            return True
+        return False
+
+    def _deliverDATA(self, data):
+        while self.dataWaiters:
+            future = self.dataWaiters.popleft()
+            if not future.done():
+                future.set_result(data)
+                return
+        self.data.append(data)
+
+    def error_received(self, exc):
+        for waiters in list(self.waiters.values()):
+            while waiters:
+                future, parse = waiters.popleft()
+                if not future.done():
+                    future.set_exception(exc)
+        while self.dataWaiters:
+            future = self.dataWaiters.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        self.error_received(exc or ConnectionError("Connection closed."))
+
+
+class AsyncXPlaneConnect(XPlaneConnect):
+    """An asyncio client for the XPCPlugin.
+
+       Requests are sent without blocking and their replies are delivered by an asyncio
+       datagram protocol, so any number of requests may be in flight at once and a single
+       event loop can drive many simulators. The `get*` methods are coroutines; the
+       `send*` methods are fire-and-forget and return immediately.
+
+       Usage:
+         async with AsyncXPlaneConnect() as client:
+             posi, ctrl = await asyncio.gather(client.getPOSI(), client.getCTRL())
+    """
+    transport = None
+    protocol = None
+
+    def __init__(self, xpHost='localhost', xpPort=49009, port=0, timeout=100):
+        """Sets up a client for an X-Plane Connect plugin running in X-Plane. Nothing is sent
+           or bound until `connect` is awaited.
+
+            Args:
+              xpHost: The hostname of the machine running X-Plane.
+              xpPort: The port on which the XPC plugin is listening. Usually 49007.
+              port: The port which will be used to send and receive data.
+              timeout: The period (in milliseconds) a request or `readDATA` waits for its
+                reply. Unlike `XPlaneConnect`, where 0 makes reads non-blocking, 0 here waits
+                without a time limit; a coroutine can be cancelled instead.
+        """
+        XPlaneConnect.__init__(self, xpHost, xpPort, port, timeout)
+
+    def _bind(self, clientAddr, timeout):
+        # The endpoint is created by `connect`, which must run inside the event loop.
+        self.clientAddr = clientAddr
+        self.timeout = timeout if timeout > 0 else None
+
+    async def connect(self):
+        """Creates the datagram endpoint. Called automatically by `async with`."""
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, self.protocol = await loop.create_datagram_endpoint(
+                _XPCProtocol, local_addr=self.clientAddr)
+        return self
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the datagram endpoint and releases resources associated with it."""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def sendUDP(self, buffer):
+        """Queues a message for sending without waiting for it to be written."""
+        # Preconditions
+        if(len(buffer) == 0):
+            raise ValueError("sendUDP: buffer is empty.")
+        if self.transport is None:
+            raise ConnectionError("sendUDP: not connected. Await connect() first.")
+
+        self.transport.sendto(buffer, self.xpDst)
+
+    def _checkConnected(self):
+        if self.protocol is None or self.transport is None:
+            raise ConnectionError("not connected. Await connect() first.")
+
+    async def _request(self, buffer, key, parse):
+        """Sends `buffer` and waits for a reply under `key` that `parse` accepts.
+
+            Returns: The parsed reply.
+        """
+        self._checkConnected()
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, parse)
+        waiters = self.protocol.waiters.setdefault(key, deque())
+        waiters.append(waiter)
+        try:
+            self.sendUDP(buffer)
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    async def readUDP(self):
+        """Waits for the next DATA message pushed by X-Plane."""
+        self._checkConnected()
+        if self.protocol.data:
+            return self.protocol.data.popleft()
+        future = asyncio.get_running_loop().create_future()
+        self.protocol.dataWaiters.append(future)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            if future in self.protocol.dataWaiters:
+                self.protocol.dataWaiters.remove(future)
+
+    async def setCONN(self, port):
+        """Sets the port on which the client sends and receives data. See `XPlaneConnect.setCONN`.
+
+           The endpoint for the new port is created before the request is sent, so the
+           plugin's confirmation cannot arrive before anything listens for it.
+        """
+        #Validate parameters
+        if port < 0 or port > 65535:
+            raise ValueError("The specified port is not a valid port number.")
+        if self.transport is None:
+            raise ConnectionError("setCONN: not connected. Await connect() first.")
+
+        #Rebind endpoint
+        oldTransport = self.transport
+        self.clientAddr = ("0.0.0.0", port)
+        if port != oldTransport.get_extra_info("sockname")[1]:
+            loop = asyncio.get_running_loop()
+            self.transport, self.protocol = await loop.create_datagram_endpoint(
+                _XPCProtocol, local_addr=self.clientAddr)
+
+        #Send command from the old port and read the response on the new one
+        future = asyncio.get_running_loop().create_future()
+        waiters = self.protocol.waiters.setdefault((b"CONF", None), deque())
+        waiter = (future, lambda buffer: None)
+        waiters.append(waiter)
+        try:
+            oldTransport.sendto(struct.pack(b"<4sxH", b"CONN", port), self.xpDst)
+            if oldTransport is not self.transport:
+                oldTransport.close()
+            await asyncio.wait_for(future, self.timeout)
+        finally:
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    # Streaming is built on the blocking socket of the synchronous client
+    def startStream(self, capacity=256):
+        """Not available; await `readDATA` instead, which never blocks the event loop."""
+        raise TypeError("AsyncXPlaneConnect does not stream on a thread; await readDATA() instead.")
+
+    def stream(self):
+        """Not available; await `readDATA` instead."""
+        raise TypeError("AsyncXPlaneConnect does not stream on a thread; await readDATA() instead.")
+
+    def latestDATA(self, row=None):
+        """Not available; await `readDATA` instead."""
+        raise TypeError("AsyncXPlaneConnect does not stream on a thread; await readDATA() instead.")
+
+    # X-Plane UDP Data
+    async def readDATA(self):
+        """Reads X-Plane data. See `XPlaneConnect.readDATA`."""
+        return self._parseDATA(await self.readUDP())
+
+    async def readDATAArray(self):
+        """Reads X-Plane data into a NumPy array. See `XPlaneConnect.readDATAArray`."""
+        rows = _dataRows(await self.readUDP())
+        if rows is None:
+            return None
+        return _rowsToArray(rows)
+
+    async def readDATAInto(self, accumulator):
+        """Reads X-Plane data into a `DATAAccumulator`. See `XPlaneConnect.readDATAInto`."""
+        return accumulator.extend(await self.readUDP())
+
+    # Position
+    async def getPOSI(self, ac=0):
+        """Gets position information for the specified aircraft. See `XPlaneConnect.getPOSI`."""
+        buffer = struct.pack(b"<4sxB", b"GETP", ac)
+        return await self._request(buffer, (b"POSI", ac), self._parsePOSI)
+
+    # Controls
+    async def getCTRL(self, ac=0):
+        """Gets the control surface information for the specified aircraft. See
+           `XPlaneConnect.getCTRL`.
+        """
+        buffer = struct.pack(b"<4sxB", b"GETC", ac)
+        return await self._request(buffer, (b"CTRL", ac), self._parseCTRL)
+
+    # DREF Manipulation
+    async def getDREF(self, dref):
+        """Gets the value of an X-Plane dataref. See `XPlaneConnect.getDREF`."""
+        return (await self.getDREFs([dref]))[0]
+
+    async def getDREFs(self, drefs):
+        """Gets the value of one or more X-Plane datarefs. See `XPlaneConnect.getDREFs`."""
+        request, parse = self._resolveGETD(drefs)
+        return await self._request(request, (b"RESP", None), parse)
+
+    # Combined Requests
+    async def getSnapshot(self, drefs, ac=0):
+        """Gets position information and dataref values concurrently. See
+           `XPlaneConnect.getSnapshot`.
+        """
+        return tuple(await asyncio.gather(self.getPOSI(ac), self.getDREFs(drefs)))
+
+    # Multi-Aircraft Requests
+    async def getPOSIs(self, acs):
+        """Gets position information for several aircraft concurrently. See
+           `XPlaneConnect.getPOSIs`.
+        """
+        acs = _checkAircraft(acs)
+        return _rowsToMatrix(await asyncio.gather(*[self.getPOSI(ac) for ac in acs]), 7)
+
+    async def getCTRLs(self, acs):
+        """Gets control surface information for several aircraft concurrently. See
+           `XPlaneConnect.getCTRLs`.
+        """
+        acs = _checkAircraft(acs)
+        return _rowsToMatrix(await asyncio.gather(*[self.getCTRL(ac) for ac in acs]), 7)
+
+
+class XPlaneConnectPool(object):
+    """Manages connections to many simulators from a single thread.
+
+       Each station is an `XPlaneConnect` with its own socket. The pool registers every
+       socket with one `selectors` selector, so a request made to all stations is sent to
+       each of them first and the replies are collected as they arrive. Polling N stations
+       takes about one round trip rather than N, with no thread per station.
+
+       Usage:
+         with XPlaneConnectPool() as pool:
+             pool.add("sim1", "10.0.0.11")
+             pool.add("sim2", "10.0.0.12")
+             positions = pool.getPOSI()     # {"sim1": (...), "sim2": (...)}
+             pool["sim1"].sendTEXT("Hello, sim1")
+             pool.pauseSim(True)
+    """
+    def __init__(self, timeout=100):
+        """Creates an empty pool.
+
+            Args:
+              timeout: The period (in milliseconds) to wait for the replies to one request.
+        """
+        if timeout < 0:
+            raise ValueError("timeout must be non-negative.")
+
+        self.timeout = timeout / 1000.0
+        self.clients = {}
+        self.selector = selectors.DefaultSelector()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __getitem__(self, name):
+        return self.clients[name]
+
+    def __contains__(self, name):
+        return name in self.clients
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def add(self, name, xpHost='localhost', xpPort=49009, port=0):
+        """Connects to a simulator and adds it to the pool.
+
+            Args:
+              name: The name used to refer to the station.
+              xpHost: The hostname of the machine running X-Plane.
+              xpPort: The port on which the XPC plugin is listening.
+              port: The local port used to talk to this station. 0 picks a free port.
+
+            Returns: The station's `XPlaneConnect`.
+        """
+        if name in self.clients:
+            raise ValueError("A station named " + str(name) + " already exists.")
+
+        client = XPlaneConnect(xpHost, xpPort, port, int(self.timeout * 1000))
+        self.clients[name] = client
+        self.selector.register(client.socket, selectors.EVENT_READ, name)
+        return client
+
+    def remove(self, name):
+        """Removes a station from the pool and closes its connection."""
+        client = self.clients.pop(name)
+        self.selector.unregister(client.socket)
+        client.close()
+
+    def close(self):
+        """Closes every station and the selector."""
+        for name in list(self.clients):
+            self.remove(name)
+        self.selector.close()
+
+    # Broadcast
+    def broadcast(self, method, *args, **kwargs):
+        """Calls the named send method on every station, e.g. `broadcast("sendDREF", dref, 1)`."""
+        for client in self.clients.values():
+            getattr(client, method)(*args, **kwargs)
+
+    def pauseSim(self, pause):
+        """Pauses or un-pauses every station. See `XPlaneConnect.pauseSim`."""
+        self.broadcast("pauseSim", pause)
+
+    def sendTEXT(self, msg, x=-1, y=-1):
+        """Displays a message on every station. See `XPlaneConnect.sendTEXT`."""
+        self.broadcast("sendTEXT", msg, x, y)
+
+    # Gathered Requests
+    def getPOSI(self, ac=0, names=None):
+        """Gets position information from every station. See `XPlaneConnect.getPOSI`.
+
+            Returns: A dictionary mapping each station name to its result, or to None if the
+              station did not reply in time.
+        """
+        buffer = struct.pack(b"<4sxB", b"GETP", ac)
+        return self._first(self._gather(names, lambda client: [(buffer, (b"POSI", ac), client._parsePOSI)]))
+
+    def getCTRL(self, ac=0, names=None):
+        """Gets control surface information from every station. See `XPlaneConnect.getCTRL`.
+
+            Returns: A dictionary mapping each station name to its result, or to None if the
+              station did not reply in time.
+        """
+        buffer = struct.pack(b"<4sxB", b"GETC", ac)
+        return self._first(self._gather(names, lambda client: [(buffer, (b"CTRL", ac), client._parseCTRL)]))
+
+    def getDREFs(self, drefs, names=None):
+        """Gets dataref values from every station. See `XPlaneConnect.getDREFs`.
+
+            Returns: A dictionary mapping each station name to its result, or to None if the
+              station did not reply in time.
+        """
+        def requests(client):
+            request, parse = client._resolveGETD(drefs)
+            return [(request, (b"RESP", None), parse)]
+        return self._first(self._gather(names, requests))
+
+    def getSnapshot(self, drefs, ac=0, names=None):
+        """Gets position information and dataref values from every station in one round trip.
+           See `XPlaneConnect.getSnapshot`.
+
+            Returns: A dictionary mapping each station name to its `(posi, values)` tuple, or
+              to None if the station did not reply in time.
+        """
+        buffer = struct.pack(b"<4sxB", b"GETP", ac)
+        def requests(client):
+            request, parse = client._resolveGETD(drefs)
+            return [(buffer, (b"POSI", ac), client._parsePOSI), (request, (b"RESP", None), parse)]
+        return dict((name, None if result is None else tuple(result))
+                    for name, result in self._gather(names, requests).items())
+
+    def _first(self, results):
+        return dict((name, None if result is None else result[0]) for name, result in results.items())
+
+    def _gather(self, names, requests):
+        """Sends `requests(client)` to each named station (all stations if `names` is None),
+           then serves every station's socket from the selector until all replies are in or
+           the timeout expires.
+
+            Returns: A dictionary mapping station names to their list of parsed replies, or to
+              None for stations that did not reply in time or could not be sent the requests.
+        """
+        if names is None:
+            names = list(self.clients)
+
+        exchanges = {}
+        for name in names:
+            client = self.clients[name]
+            try:
+                exchanges[name] = client._beginExchange(requests(client))
+            except OSError:
+                exchanges[name] = None  # e.g. an unreachable station; the others are still polled
+
+        waiting = set(name for name, exchange in exchanges.items()
+                      if exchange is not None and exchange.remaining)
+        deadline = time.monotonic() + self.timeout
+        while waiting:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, events in self.selector.select(remaining):
+                name = key.data
+                exchange = exchanges.get(name)
+                try:
+                    self.clients[name]._receive(exchange)
+                except OSError:
+                    continue
+                if exchange is not None and not exchange.remaining:
+                    waiting.discard(name)
+
+        return dict((name, None if exchange is None or exchange.remaining else exchange.results)
+                    for name, exchange in exchanges.items())
+
+
 class ViewType(object):
     Forwards = 73
     Down = 74